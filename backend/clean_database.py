@@ -1,4 +1,5 @@
 import json
+from storage import write_json_atomic
 
 def clean_database():
     print("Reading food database...")
@@ -27,8 +28,7 @@ def clean_database():
     print(f"New number of foods: {new_count}")
     
     print("Saving cleaned database...")
-    with open('backend/food_database.json', 'w') as f:
-        json.dump(data, f, indent=2)
+    write_json_atomic('backend/food_database.json', data)
     print("Database cleaned and saved successfully!")
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""Progress of an expand_database.py crawl, so an interrupted run resumes where it stopped.
+
+The journal is an append-only JSON-lines file with one entry per search
+results page handled, {"op": "page", "category", "page", "fdc_ids", "added",
+"complete"}, so each checkpoint costs one short fsynced append. The foods
+of a page go to the mutation log before the page is journaled. A crash can
+therefore at worst repeat the current page, and its foods are then skipped
+as duplicates by name.
+"""
+
+import os
+from typing import Iterable, Set, Tuple
+
+from mutation_log import MutationLog
+
+
+def journal_path_for(database_path: str) -> str:
+    """Default crawl journal location next to a JSON database."""
+    return os.path.splitext(database_path)[0] + ".crawl"
+
+
+class CrawlJournal:
+    def __init__(self, path: str):
+        self.path = path
+        self._log = MutationLog(path)
+        # Pages fully handled, as (category, page)
+        self.done: Set[Tuple[str, int]] = set()
+        # FDC IDs already converted, possibly on a page that is not done
+        self.fdc_ids: Set[int] = set()
+        self.added = 0
+        for entry in self._log.read():
+            if entry.get("op") != "page":
+                continue
+            if entry.get("complete", True):
+                self.done.add((entry["category"], entry["page"]))
+            self.fdc_ids.update(entry["fdc_ids"])
+            self.added += entry.get("added", 0)
+
+    def is_done(self, category: str, page: int) -> bool:
+        return (category, page) in self.done
+
+    def record_page(self, category: str, page: int, fdc_ids: Iterable[int], added: int,
+                    complete: bool = True) -> None:
+        """Durably record the FDC IDs handled on a page; an incomplete page is fetched again on resume."""
+        fdc_ids = list(fdc_ids)
+        self._log.append([{"op": "page", "category": category, "page": page, "fdc_ids": fdc_ids,
+                           "added": added, "complete": complete}])
+        if complete:
+            self.done.add((category, page))
+        self.fdc_ids.update(fdc_ids)
+        self.added += added
+
+    def clear(self) -> None:
+        """Forget all progress, so the next crawl starts from the first page."""
+        self._log.clear()
+        self.done.clear()
+        self.fdc_ids.clear()
+        self.added = 0
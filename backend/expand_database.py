@@ -4,12 +4,22 @@ import requests
 import time
 from tqdm import tqdm
 import random
+import sys
+from crawl_journal import CrawlJournal, journal_path_for
+from fdc_bulk import abridged_food, iter_dump_foods
+from food_database_manager import FoodDatabaseManager
+from http_cache import HTTPCache
+from mutation_log import MutationLog, log_path_for
+from snapshot import read_database
 
 # USDA Food Database API
 # You'll need to get a free API key from: https://fdc.nal.usda.gov/api-key-signup.html
 API_KEY = None  # Will be set at runtime
 BASE_URL = "https://api.nal.usda.gov/fdc/v1"
 
+# Raw API responses, shared with food_data_fetcher.py; reruns are served from disk
+http_cache = HTTPCache.from_env()
+
 # Categories to fetch
 CATEGORIES = [
     "Fruits and Fruit Juices",
@@ -48,9 +58,16 @@ def get_food_by_category(category, page_size=50, page_number=1, api_key=None):
         "sortOrder": "asc"
     }
     
+    cached = http_cache.get_json("GET", "/foods/search", params)
+    if cached is not None:
+        return cached
+
     try:
         response = requests.get(url, params=params)
+        # Sleep to avoid rate limiting
+        time.sleep(1)
         if response.status_code == 200:
+            http_cache.put("GET", "/foods/search", params, None, response.content)
             return response.json()
         else:
             print(f"Error fetching {category}: {response.status_code}")
@@ -59,6 +76,11 @@ def get_food_by_category(category, page_size=50, page_number=1, api_key=None):
         print(f"Exception fetching {category}: {str(e)}")
         return None
 
+def nutrient_number(nutrient):
+    """USDA nutrient number of a foodNutrients entry, e.g. "203" for protein"""
+    number = nutrient.get("nutrientNumber")
+    return str(number if number else nutrient.get("nutrientId", ""))
+
 def extract_nutrients(food_data):
     """Extract relevant nutrients from USDA food data"""
     nutrients = {}
@@ -77,7 +99,7 @@ def extract_nutrients(food_data):
     
     # Extract nutrients
     for nutrient in food_data.get("foodNutrients", []):
-        nutrient_id = str(nutrient.get("nutrientId", ""))
+        nutrient_id = nutrient_number(nutrient)
         if nutrient_id in nutrient_map:
             value = nutrient.get("value", 0)
             nutrients[nutrient_map[nutrient_id]] = round(value, 1)
@@ -106,7 +128,7 @@ def extract_vitamins(food_data):
     
     # Extract vitamins
     for nutrient in food_data.get("foodNutrients", []):
-        nutrient_id = str(nutrient.get("nutrientId", ""))
+        nutrient_id = nutrient_number(nutrient)
         if nutrient_id in vitamin_map:
             value = nutrient.get("value", 0)
             vitamins[vitamin_map[nutrient_id]] = round(value, 3)
@@ -130,7 +152,7 @@ def extract_minerals(food_data):
     
     # Extract minerals
     for nutrient in food_data.get("foodNutrients", []):
-        nutrient_id = str(nutrient.get("nutrientId", ""))
+        nutrient_id = nutrient_number(nutrient)
         if nutrient_id in mineral_map:
             value = nutrient.get("value", 0)
             minerals[mineral_map[nutrient_id]] = round(value, 2)
@@ -169,7 +191,7 @@ def determine_glycemic_index(food_data):
     # Get carbohydrate content
     carbs = 0
     for nutrient in food_data.get("foodNutrients", []):
-        if nutrient.get("nutrientId") == 205:  # Carbohydrate
+        if nutrient_number(nutrient) == "205":  # Carbohydrate
             carbs = nutrient.get("value", 0)
             break
     
@@ -216,7 +238,7 @@ def generate_health_benefits(food_data):
     vitamin_a = 0
     
     for nutrient in food_data.get("foodNutrients", []):
-        nutrient_id = str(nutrient.get("nutrientId", ""))
+        nutrient_id = nutrient_number(nutrient)
         value = nutrient.get("value", 0)
         
         if nutrient_id == "203":  # Protein
@@ -280,7 +302,8 @@ def generate_health_benefits(food_data):
     return benefits[:5]  # Return at most 5 benefits
 
 def convert_usda_food_to_our_format(food_data):
-    """Convert USDA food data to our format"""
+    """Convert USDA food data (search result, details or dump record) to our format"""
+    food_data = abridged_food(food_data)
     nutrients = extract_nutrients(food_data)
     vitamins = extract_vitamins(food_data)
     minerals = extract_minerals(food_data)
@@ -372,32 +395,54 @@ def is_similar_food(name1, name2):
     # Only consider exact matches
     return name1_lower == name2_lower
 
-def expand_database(target_count=10000, api_key=None):
-    """Expand the food database to the target count"""
+def load_food_names(database_path):
+    """Names of the foods in the database and its mutation log, without keeping the records"""
+    names, compacted_log = [], None
+    if os.path.exists(database_path):
+        foods, compacted_log, _ = read_database(database_path)
+        names = [food["name"] for food in foods]
+    names.extend(food["name"] for food in MutationLog(log_path_for(database_path)).added_foods(compacted_log))
+    return names
+
+def compact_into_json(database_path, expected_count):
+    """Fold the mutation log into the JSON database and check that it holds every food"""
+    FoodDatabaseManager(database_path).compact()
+    count = len(read_database(database_path)[0])
+    if count != expected_count or os.path.exists(log_path_for(database_path)):
+        raise RuntimeError(f"Compacting {database_path} left {count} foods, expected {expected_count}; "
+                           f"the mutation log was kept")
+
+def expand_database(target_count=10000, api_key=None, restart=False):
+    """Expand the food database to the target count.
+
+    New foods are appended to the mutation log one page at a time, and each
+    page is checkpointed in the crawl journal, so an interrupted run resumes
+    at the page it stopped at. The log is compacted into the JSON file at the end.
+    """
     if not api_key:
         raise ValueError("API key is required to expand the database")
         
     current_dir = os.path.dirname(os.path.abspath(__file__))
     database_path = os.path.join(current_dir, 'food_database.json')
-    
-    # Load existing database
-    try:
-        with open(database_path, 'r', encoding='utf-8') as f:
-            database = json.load(f)
-    except:
-        database = {"foods": []}
+    log = MutationLog(log_path_for(database_path))
+    journal = CrawlJournal(journal_path_for(database_path))
+    if restart:
+        journal.clear()
+    elif journal.done or journal.fdc_ids:
+        print(f"Resuming crawl: {len(journal.done)} pages and {len(journal.fdc_ids)} FDC IDs already processed")
     
     # Check unique foods in the database
     total_foods, unique_names, similar_names = check_unique_foods(database_path)
     
     # Create a set of existing food names for faster lookup
-    existing_foods = {food["name"].lower() for food in database["foods"]}
-    print(f"Current database has {len(database['foods'])} foods")
+    names = load_food_names(database_path)
+    existing_foods = {name.lower() for name in names}
+    print(f"Current database has {len(names)} foods")
     
     # Calculate how many more foods we need
-    foods_needed = target_count - len(database["foods"])
+    foods_needed = target_count - len(names)
     if foods_needed <= 0:
-        print(f"Database already has {len(database['foods'])} foods, which is >= {target_count}")
+        print(f"Database already has {len(names)} foods, which is >= {target_count}")
         return
     
     print(f"Need to add {foods_needed} more foods")
@@ -416,6 +461,8 @@ def expand_database(target_count=10000, api_key=None):
             for category in CATEGORIES:
                 if foods_added >= foods_needed:
                     break
+                if journal.is_done(category, page):
+                    continue
                 
                 print(f"\nFetching {category} (page {page})...")
                 result = get_food_by_category(category, page_size=50, page_number=page, api_key=api_key)
@@ -426,10 +473,20 @@ def expand_database(target_count=10000, api_key=None):
                 
                 print(f"Found {len(result['foods'])} foods in {category} (page {page})")
                 
+                new_foods = []
+                processed_ids = []
+                complete = True
                 for food_data in result["foods"]:
                     if foods_added >= foods_needed:
+                        complete = False
                         break
                     
+                    fdc_id = food_data.get("fdcId")
+                    if fdc_id in journal.fdc_ids:
+                        continue
+                    if fdc_id is not None:
+                        processed_ids.append(fdc_id)
+                    
                     try:
                         food = convert_usda_food_to_our_format(food_data)
                         food_name = food["name"].lower()
@@ -452,39 +509,91 @@ def expand_database(target_count=10000, api_key=None):
                                 print(f"Skipped {foods_skipped} duplicate foods so far")
                             continue
                         
-                        database["foods"].append(food)
+                        new_foods.append(food)
                         existing_foods.add(food_name)
                         foods_added += 1
                         pbar.update(1)
-                        
-                        # Save progress every 100 foods
-                        if foods_added % 100 == 0:
-                            with open(database_path, 'w', encoding='utf-8') as f:
-                                json.dump(database, f, indent=2)
-                            print(f"\nSaved progress: {foods_added} foods added so far")
                     except Exception as e:
                         foods_failed += 1
                         if foods_failed % 5 == 0:
                             print(f"Failed to process {foods_failed} foods so far. Last error: {str(e)}")
                 
-                # Sleep to avoid rate limiting
-                time.sleep(1)
+                # Checkpoint: the foods first, then the page that produced them
+                log.append_foods(new_foods)
+                journal.record_page(category, page, processed_ids, len(new_foods), complete)
             
             page += 1
     
-    # Save final database
-    with open(database_path, 'w', encoding='utf-8') as f:
-        json.dump(database, f, indent=2)
+    # Fold the logged foods into the JSON database once, at the end; the
+    # crawl is then finished and the next run starts a new one
+    if os.path.exists(log.path):
+        compact_into_json(database_path, len(names) + foods_added)
+    journal.clear()
     
     print(f"\nDatabase expansion complete! Added {foods_added} new foods.")
     print(f"Skipped {foods_skipped} duplicate foods.")
     print(f"Failed to process {foods_failed} foods.")
-    print(f"Total foods in database: {len(database['foods'])}")
+    print(f"Total foods in database: {len(names) + foods_added}")
     
     # Check unique foods in the updated database
     check_unique_foods(database_path)
 
+def import_from_dump(dump_path, target_count=None, data_types=None, batch_size=1000,
+                     convert=convert_usda_food_to_our_format):
+    """Add foods from a downloaded FDC JSON dump file or CSV dump directory, without the network.
+
+    Foods are converted with `convert`, appended to the mutation log in
+    batches and compacted into the JSON database once at the end.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    database_path = os.path.join(current_dir, 'food_database.json')
+    log = MutationLog(log_path_for(database_path))
+
+    names = load_food_names(database_path)
+    existing_foods = {name.lower() for name in names}
+    print(f"Current database has {len(names)} foods")
+
+    foods_added = 0
+    foods_skipped = 0
+    foods_failed = 0
+    new_foods = []
+
+    for food_data in tqdm(iter_dump_foods(dump_path, data_types), desc="Importing dump"):
+        if target_count and len(names) + foods_added >= target_count:
+            break
+        try:
+            food = convert(food_data)
+        except Exception as e:
+            foods_failed += 1
+            if foods_failed % 5 == 0:
+                print(f"Failed to process {foods_failed} foods so far. Last error: {str(e)}")
+            continue
+        food_name = food["name"].lower()
+        if food_name in existing_foods:
+            foods_skipped += 1
+            continue
+        new_foods.append(food)
+        existing_foods.add(food_name)
+        foods_added += 1
+        if len(new_foods) == batch_size:
+            log.append_foods(new_foods)
+            new_foods = []
+
+    log.append_foods(new_foods)
+    if os.path.exists(log.path):
+        compact_into_json(database_path, len(names) + foods_added)
+
+    print(f"\nDump import complete! Added {foods_added} new foods.")
+    print(f"Skipped {foods_skipped} duplicate foods.")
+    print(f"Failed to process {foods_failed} foods.")
+    print(f"Total foods in database: {len(names) + foods_added}")
+
 if __name__ == "__main__":
+    # python expand_database.py <dump> [target_count] imports a local FDC dump instead
+    if len(sys.argv) > 1:
+        import_from_dump(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        sys.exit(0)
+
     print("=== Food Database Expansion Tool ===")
     print("This tool will expand your food database to 10,000-15,000 items.")
     print("You need a USDA Food Database API key to use this tool.")
@@ -503,5 +612,11 @@ if __name__ == "__main__":
     except:
         target_count = 10000
     
+    # Resume an interrupted crawl unless asked to start over
+    restart = False
+    database_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_database.json')
+    if os.path.exists(journal_path_for(database_path)):
+        restart = input("Resume the previous crawl? (y/n, default: y): ").lower() == 'n'
+    
     # Run the expansion
-    expand_database(target_count, api_key) 
\ No newline at end of file
+    expand_database(target_count, api_key, restart) 
\ No newline at end of file
@@ -0,0 +1,21 @@
+from typing import Iterable, Iterator, Optional, Sequence
+
+from nutrient_store import NutrientStore
+from serialization import dumps
+
+# Rows materialized per yielded chunk; bounds memory regardless of database size
+EXPORT_CHUNK_ROWS = 1000
+
+
+def iter_ndjson(store: NutrientStore, categories: Optional[Iterable[str]] = None,
+                fields: Optional[Sequence[str]] = None, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield the database as newline-delimited JSON records, a chunk of rows at a time.
+
+    `categories` keeps only foods in those categories (via the store's
+    category index) and `fields` limits each record to those fields. Only one
+    chunk of records is ever materialized.
+    """
+    rows = range(len(store)) if categories is None else store.category_rows(categories)
+    for start in range(0, len(rows), chunk_rows):
+        lines = [dumps(store.record(row, fields)) for row in rows[start:start + chunk_rows]]
+        yield b"\n".join(lines) + b"\n"
@@ -0,0 +1,222 @@
+"""Read USDA FoodData Central foods in bulk, from the API or from downloaded dumps.
+
+FDC returns nutrients in two shapes. Search results use the abridged shape
+({"nutrientId", "nutrientNumber", "nutrientName", "value"}). The detail
+endpoints and the downloadable dumps use the full shape
+({"nutrient": {"id", "number", "name"}, "amount"}). `abridged_food`
+converts either into the abridged shape that `process_food_data` and
+`convert_usda_food_to_our_format` read.
+
+Dumps are read without the network and without loading a whole file:
+- JSON dumps (e.g. FoodData_Central_foundation_food_json_*.json) are decoded
+  one food at a time.
+- CSV dumps (an extracted FoodData_Central_csv_* directory) are merge-joined
+  on fdc_id in one pass, since food.csv, food_nutrient.csv and
+  branded_food.csv are sorted by it. Only one food's rows are held at a time,
+  and only the nutrients the converters use are kept.
+"""
+
+import csv
+import json
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+# FDC accepts at most this many IDs per POST /foods request
+MAX_IDS_PER_REQUEST = 20
+
+# Nutrient numbers read by the converters: energy, protein, fat, carbs,
+# fiber, calcium, iron, potassium, vitamin A, vitamin C and vitamin B6
+DEFAULT_NUTRIENT_NUMBERS = frozenset({"208", "203", "204", "205", "291", "301", "303", "306", "318", "401", "415"})
+
+# CSV data_type values of actual foods, and their API names
+CSV_DATA_TYPES = {
+    "foundation_food": "Foundation",
+    "sr_legacy_food": "SR Legacy",
+    "survey_fndds_food": "Survey (FNDDS)",
+    "branded_food": "Branded",
+}
+
+
+def batched(items: Iterable, size: int = MAX_IDS_PER_REQUEST) -> Iterator[List]:
+    """Split `items` into lists of at most `size`."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _food_category(food: Dict) -> str:
+    category = food.get("foodCategory")
+    if isinstance(category, dict):
+        return category.get("description", "")
+    if category:
+        return category
+    if food.get("brandedFoodCategory"):
+        return food["brandedFoodCategory"]
+    return (food.get("wweiaFoodCategory") or {}).get("wweiaFoodCategoryDescription", "")
+
+
+def abridged_food(food: Dict) -> Dict:
+    """A search-result shaped copy of a food in either FDC shape."""
+    nutrients = []
+    for item in food.get("foodNutrients", []):
+        nutrient = item.get("nutrient")
+        if nutrient is None:
+            nutrients.append(item)
+            continue
+        nutrients.append({
+            "nutrientId": nutrient.get("id"),
+            "nutrientNumber": nutrient.get("number"),
+            "nutrientName": nutrient.get("name", ""),
+            "unitName": nutrient.get("unitName", ""),
+            "value": item.get("amount", 0),
+        })
+    return {**food, "foodCategory": _food_category(food), "foodNutrients": nutrients}
+
+
+def iter_json_dump(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict]:
+    """Foods of a JSON dump ({"FoundationFoods": [...]} or a plain list), one at a time."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = f.read(chunk_size)
+        while "[" not in buffer:
+            more = f.read(chunk_size)
+            if not more:
+                return
+            buffer += more
+        position = buffer.index("[") + 1
+        while True:
+            # Skip the separators before the next food, reading on as needed
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                buffer, position = f.read(chunk_size), 0
+                if not buffer:
+                    raise ValueError(f"Unexpected end of {path}")
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                food, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield abridged_food(food)
+
+
+def _read_csv(directory: str, name: str) -> Iterator[Dict[str, str]]:
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        return
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _nutrient_number(value: str) -> str:
+    # Some releases write nutrient numbers as floats ("203.0")
+    return value[:-2] if value.endswith(".0") else value
+
+
+class _SortedGroups:
+    """Rows of a CSV sorted by fdc_id, taken one fdc_id at a time in ascending order."""
+
+    def __init__(self, rows: Iterator[Dict[str, str]], name: str):
+        self._rows = rows
+        self._name = name
+        self._pending = next(rows, None)
+        self._last = -1
+
+    def take(self, fdc_id: int) -> List[Dict[str, str]]:
+        """The rows of `fdc_id`, skipping those of smaller IDs."""
+        group = []
+        while self._pending is not None:
+            current = int(self._pending["fdc_id"])
+            if current < self._last:
+                raise ValueError(f"{self._name} is not sorted by fdc_id")
+            self._last = current
+            if current > fdc_id:
+                break
+            if current == fdc_id:
+                group.append(self._pending)
+            self._pending = next(self._rows, None)
+        return group
+
+
+def iter_csv_dump(directory: str, data_types: Optional[Iterable[str]] = None,
+                  nutrient_numbers: Optional[Set[str]] = DEFAULT_NUTRIENT_NUMBERS) -> Iterator[Dict]:
+    """Foods of an extracted CSV dump, in food.csv (fdc_id) order, streamed.
+
+    `data_types` are API names ("Foundation", "SR Legacy", ...), by default all
+    of CSV_DATA_TYPES; `nutrient_numbers=None` keeps every nutrient. Raises
+    ValueError if a joined file is not sorted by fdc_id.
+    """
+    wanted_types = set(data_types or CSV_DATA_TYPES.values())
+    nutrients = {}
+    for row in _read_csv(directory, "nutrient.csv"):
+        number = _nutrient_number(row.get("nutrient_nbr", ""))
+        if nutrient_numbers is None or number in nutrient_numbers:
+            nutrients[row["id"]] = (int(row["id"]), number, row["name"], row.get("unit_name", ""))
+    categories = {row["id"]: row["description"] for row in _read_csv(directory, "food_category.csv")}
+    survey_categories = {row["wweia_food_category"]: row["wweia_food_category_description"]
+                         for row in _read_csv(directory, "wweia_food_category.csv")}
+
+    food_nutrients = _SortedGroups(_read_csv(directory, "food_nutrient.csv"), "food_nutrient.csv")
+    branded_foods = _SortedGroups(_read_csv(directory, "branded_food.csv"), "branded_food.csv")
+    last_id = -1
+    for row in _read_csv(directory, "food.csv"):
+        fdc_id = int(row["fdc_id"])
+        if fdc_id < last_id:
+            raise ValueError("food.csv is not sorted by fdc_id")
+        last_id = fdc_id
+        data_type = CSV_DATA_TYPES.get(row["data_type"])
+        if data_type not in wanted_types:
+            continue
+
+        category_id = row.get("food_category_id", "")
+        if data_type == "Branded":
+            branded = branded_foods.take(fdc_id)
+            category = branded[0].get("branded_food_category", "") if branded else ""
+        elif data_type == "Survey (FNDDS)":
+            category = survey_categories.get(category_id, "")
+        else:
+            category = categories.get(category_id, "")
+
+        nutrient_entries = []
+        for nutrient_row in food_nutrients.take(fdc_id):
+            nutrient = nutrients.get(nutrient_row["nutrient_id"])
+            if nutrient is None or not nutrient_row.get("amount"):
+                continue
+            nutrient_id, number, name, unit = nutrient
+            nutrient_entries.append({
+                "nutrientId": nutrient_id,
+                "nutrientNumber": number,
+                "nutrientName": name,
+                "unitName": unit,
+                "value": float(nutrient_row["amount"]),
+            })
+
+        yield {
+            "fdcId": fdc_id,
+            "description": row["description"],
+            "dataType": data_type,
+            "foodCategory": category,
+            "foodNutrients": nutrient_entries,
+        }
+
+
+def iter_dump_foods(path: str, data_types: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+    """Foods of a JSON dump file or an extracted CSV dump directory, abridged."""
+    if os.path.isdir(path):
+        yield from iter_csv_dump(path, data_types)
+        return
+    wanted_types = set(data_types) if data_types else None
+    for food in iter_json_dump(path):
+        if wanted_types is None or food.get("dataType") in wanted_types:
+            yield food
@@ -0,0 +1,78 @@
+from typing import Dict, List, Tuple
+
+from keyword_matcher import KeywordMatcher
+
+# List of keywords that indicate a liquid food
+LIQUID_FOODS = [
+    "coffee", "tea", "juice", "milk", "smoothie", "shake", "beverage", "drink",
+    "americano", "espresso", "latte", "cappuccino", "water", "soda", "beer", "wine",
+    "cortado", "macchiato", "mocha", "frappuccino", "cold brew", "nitro", "lungo",
+    "ristretto", "flat white", "affogato"
+]
+
+_LIQUID_MATCHER = KeywordMatcher((keyword, True) for keyword in LIQUID_FOODS)
+
+def is_liquid_food(food_name):
+    """Check if a food is a liquid based on its name"""
+    return _LIQUID_MATCHER.matches(food_name.lower())
+
+# Common allergens and their related keywords
+DEFINITE_ALLERGEN_INDICATORS = {
+    "Dairy": ["milk", "cheese", "yogurt", "butter", "chocolate", "latte", "cappuccino", "mocha", "hot chocolate"],
+    "Nuts": ["almond", "walnut", "pecan", "cashew", "pistachio", "hazelnut", "macadamia"],
+    "Peanut": ["peanut", "peanuts"],
+    "Fish": ["salmon", "tuna", "cod", "tilapia", "halibut"],
+    "Shellfish": ["shrimp", "crab", "lobster"],
+    "Egg": ["egg ", "eggs"],  # space after 'egg' to avoid matching 'eggplant'
+    "Soy": ["tofu", "soya", "edamame"],
+    "Wheat": ["wheat"]
+}
+
+# Keywords that suggest possible presence of allergens
+POSSIBLE_ALLERGEN_INDICATORS = {
+    "Dairy": ["cream", "whey", "casein", "lactose", "milky"],
+    "Nuts": ["nut"],
+    "Gluten": ["rye", "barley", "oats", "bread", "pasta", "flour", "cereal"],
+    "Soy": ["miso", "tempeh"],
+    "Egg": ["mayonnaise", "meringue", "albumin"],
+    "Fish": ["fish", "anchovy"],
+    "Shellfish": ["prawn", "clam", "mussel", "oyster"],
+    "Sesame": ["sesame", "tahini"]
+}
+
+# Both indicator tables compiled into one automaton. Keywords are matched
+# with spaces removed against the name with spaces removed: any keyword that
+# occurs in the name still occurs once both lose their spaces, and phrases
+# like "hot chocolate" written as one word are caught too.
+_ALLERGEN_MATCHER = KeywordMatcher(
+    [(keyword.replace(" ", ""), (allergen, True))
+     for allergen, keywords in DEFINITE_ALLERGEN_INDICATORS.items() for keyword in keywords]
+    + [(keyword.replace(" ", ""), (allergen, False))
+       for allergen, keywords in POSSIBLE_ALLERGEN_INDICATORS.items() for keyword in keywords]
+)
+
+AllergenProfile = Tuple[Tuple[str, bool], ...]
+
+def allergen_profile(food_name: str) -> AllergenProfile:
+    """
+    Detect allergens in a food based on its name as (name, definite) pairs:
+    definite allergens first, then possible ones not already found as definite
+    """
+    found = _ALLERGEN_MATCHER.labels(food_name.lower().replace(" ", ""))
+    definite = [allergen for allergen in DEFINITE_ALLERGEN_INDICATORS if (allergen, True) in found]
+    possible = [
+        allergen for allergen in POSSIBLE_ALLERGEN_INDICATORS
+        if (allergen, False) in found and allergen not in definite
+    ]
+    return tuple((allergen, True) for allergen in definite) + tuple((allergen, False) for allergen in possible)
+
+def profile_to_allergens(profile: AllergenProfile) -> List[Dict]:
+    """Expand an allergen profile into the API's list of allergen dicts"""
+    return [{"name": name, "definite": definite} for name, definite in profile]
+
+def detect_allergens(food_name):
+    """
+    Detect allergens in a food based on its name, distinguishing between
+    definite and possible allergens
+    """
+    return profile_to_allergens(allergen_profile(food_name))
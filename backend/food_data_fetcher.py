@@ -1,25 +1,46 @@
+import argparse
+import asyncio
+import httpx
 import requests
-import json
 import time
-from typing import List, Dict
+from typing import List, Dict, Optional, Sequence
 import os
 from dotenv import load_dotenv
 
+from fdc_bulk import MAX_IDS_PER_REQUEST, abridged_food, batched
+from http_cache import HTTPCache
+from storage import write_json_atomic
+from usda_client import AsyncUSDAClient, DEFAULT_REQUESTS_PER_HOUR
+
 # Load environment variables
 load_dotenv()
 
 class USDAFoodDataFetcher:
-    def __init__(self):
+    def __init__(self, cache: Optional[HTTPCache] = None):
         self.api_key = os.getenv('USDA_API_KEY')
         self.base_url = 'https://api.nal.usda.gov/fdc/v1'
         self.headers = {
             'Content-Type': 'application/json',
             'X-Api-Key': self.api_key
         }
+        # Raw responses already fetched by this or another ingestion script
+        self.cache = cache
+
+    def _request_json(self, method: str, path: str, params: Optional[Dict] = None, body=None):
+        """Decoded JSON response of an API request, from the cache when possible"""
+        if self.cache is not None:
+            cached = self.cache.get_json(method, path, params, body)
+            if cached is not None:
+                return cached
+        response = requests.request(method, f"{self.base_url}{path}", headers=self.headers, params=params, json=body)
+        time.sleep(0.5)  # Rate limiting, only needed when the request went out
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.put(method, path, params, body, response.content)
+        return response.json()
 
     def search_foods(self, query: str, page_size: int = 50) -> List[Dict]:
         """Search for foods using the USDA FoodData Central API"""
-        url = f"{self.base_url}/foods/search"
         params = {
             'query': query,
             'pageSize': page_size,
@@ -28,27 +49,32 @@ class USDAFoodDataFetcher:
         }
         
         try:
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            return response.json().get('foods', [])
+            return self._request_json('GET', '/foods/search', params).get('foods', [])
         except requests.exceptions.RequestException as e:
             print(f"Error fetching data: {e}")
             return []
 
     def get_food_details(self, fdc_id: str) -> Dict:
         """Get detailed nutritional information for a specific food"""
-        url = f"{self.base_url}/food/{fdc_id}"
-        
         try:
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            return self._request_json('GET', f'/food/{fdc_id}')
         except requests.exceptions.RequestException as e:
             print(f"Error fetching food details: {e}")
             return {}
 
+    def get_many_food_details(self, fdc_ids: List) -> List[Dict]:
+        """Get details for many foods, MAX_IDS_PER_REQUEST per request"""
+        details = []
+        for batch in batched(fdc_ids, MAX_IDS_PER_REQUEST):
+            try:
+                details.extend(self._request_json('POST', '/foods', body={'fdcIds': [int(fdc_id) for fdc_id in batch]}))
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching food details for {batch}: {e}")
+        return details
+
     def process_food_data(self, food_data: Dict) -> Dict:
-        """Process and format food data into our desired structure"""
+        """Process and format food data (search result, details or dump record) into our desired structure"""
+        food_data = abridged_food(food_data)
         nutrients = {item['nutrientName']: item['value'] for item in food_data.get('foodNutrients', [])}
         
         return {
@@ -65,13 +91,57 @@ class USDAFoodDataFetcher:
             "source": "USDA"
         }
 
+    async def fetch_categories_async(self, categories: Sequence[str], page_size: int = 50,
+                                     requests_per_hour: Optional[float] = None, max_concurrency: int = 8,
+                                     transport=None) -> List[Dict]:
+        """Search every category and fetch all result details concurrently.
+
+        Requests go through one pooled AsyncUSDAClient limited to
+        `requests_per_hour` (default: USDA_REQUESTS_PER_HOUR or the free-key quota).
+        """
+        if requests_per_hour is None:
+            requests_per_hour = float(os.getenv('USDA_REQUESTS_PER_HOUR', DEFAULT_REQUESTS_PER_HOUR))
+
+        async with AsyncUSDAClient(self.api_key, self.base_url, requests_per_hour=requests_per_hour,
+                                   max_concurrency=max_concurrency, transport=transport,
+                                   cache=self.cache) as client:
+            async def fetch_category(category: str) -> List[Dict]:
+                try:
+                    foods = await client.search_foods(category, page_size)
+                except httpx.HTTPError as e:
+                    print(f"Error fetching data for {category}: {e}")
+                    return []
+                fdc_ids = [food['fdcId'] for food in foods if food.get('fdcId')]
+                details = await client.get_many_food_details(fdc_ids)
+                print(f"Processed {len(details)} items for {category}")
+                return [self.process_food_data(food_details) for food_details in details]
+
+            results = await asyncio.gather(*(fetch_category(category) for category in categories))
+        return [food for foods in results for food in foods]
+
     def save_to_json(self, foods: List[Dict], filename: str = 'food_database.json'):
         """Save processed food data to a JSON file"""
-        with open(filename, 'w') as f:
-            json.dump({"foods": foods}, f, indent=2)
+        write_json_atomic(filename, {"foods": foods})
 
 def main():
-    fetcher = USDAFoodDataFetcher()
+    parser = argparse.ArgumentParser(description="Fetch foods from USDA FoodData Central")
+    parser.add_argument("--serial", action="store_true",
+                        help="fetch one request at a time with the blocking client")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight in async mode")
+    parser.add_argument("--dump", help="add the foods of a downloaded FDC JSON dump file or CSV dump directory "
+                                       "to the database instead")
+    parser.add_argument("--data-type", action="append", dest="data_types",
+                        help="with --dump, only import this FDC data type (repeatable)")
+    parser.add_argument("--no-cache", action="store_true", help="always request, ignoring the on-disk response cache")
+    args = parser.parse_args()
+
+    fetcher = USDAFoodDataFetcher(None if args.no_cache else HTTPCache.from_env())
+
+    if args.dump:
+        # Streamed into the mutation log and compacted once, like expand_database.py
+        from expand_database import import_from_dump
+        import_from_dump(args.dump, data_types=args.data_types, convert=fetcher.process_food_data)
+        return
     
     # Example food categories to search
     categories = [
@@ -92,19 +162,21 @@ def main():
         "seafood"
     ]
     
+    if not args.serial:
+        all_foods = asyncio.run(fetcher.fetch_categories_async(categories, max_concurrency=args.concurrency))
+        fetcher.save_to_json(all_foods)
+        print(f"Total foods processed: {len(all_foods)}")
+        return
+
     all_foods = []
     
     for category in categories:
         print(f"Fetching data for {category}...")
         foods = fetcher.search_foods(category)
         
-        for food in foods:
-            fdc_id = food.get('fdcId')
-            if fdc_id:
-                food_details = fetcher.get_food_details(fdc_id)
-                processed_food = fetcher.process_food_data(food_details)
-                all_foods.append(processed_food)
-                time.sleep(0.5)  # Rate limiting
+        fdc_ids = [food['fdcId'] for food in foods if food.get('fdcId')]
+        for food_details in fetcher.get_many_food_details(fdc_ids):
+            all_foods.append(fetcher.process_food_data(food_details))
         
         print(f"Processed {len(foods)} items for {category}")
     
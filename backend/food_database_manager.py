@@ -1,149 +1,199 @@
-import json
+import glob
 import os
-from typing import Dict, List, Optional, Union
+import shutil
+from typing import Dict, Iterable, List, Optional, Sequence, Union
 from datetime import datetime
+from food_index import normalize_name
+from food_validation import FOOD_SCHEMA, RecordErrors, validate_batch
+from mutation_log import MutationLog, log_path_for
+from nutrient_store import NutrientStore
+from storage import write_json_atomic
+from snapshot import compile_snapshot, fingerprint, read_database, snapshot_path_for
+
+# Logged additions that trigger a compaction into the JSON file
+COMPACT_THRESHOLD = 1000
+
+# Backups kept; older ones are deleted on rotation
+MAX_BACKUPS = 5
 
 class FoodDatabaseManager:
-    def __init__(self, database_path: str = "food_database.json"):
+    def __init__(self, database_path: str = "food_database.json", compact_threshold: int = COMPACT_THRESHOLD):
         self.database_path = database_path
-        self.foods = []
+        self.compact_threshold = compact_threshold
+        self.log = MutationLog(log_path_for(database_path))
+        self.store = NutrientStore()
+        self.ids_by_name: Dict[str, int] = {}
         self.load_database()
 
+    @property
+    def foods(self) -> List[Dict]:
+        """All food items materialized as plain dicts."""
+        return list(self.store.records())
+
     def load_database(self) -> None:
-        """Load the food database from JSON file."""
-        try:
-            if os.path.exists(self.database_path):
-                with open(self.database_path, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    self.foods = data.get('foods', [])
-            else:
-                self.foods = []
-                self.save_database()
-        except json.JSONDecodeError:
-            print(f"Error: {self.database_path} is not a valid JSON file")
-            self.foods = []
+        """Load the food database from JSON file and replay the mutation log.
+
+        A missing file is an empty database. A file that does not parse
+        raises, so it is never compacted over.
+        """
+        # The mutation log checkpoint the JSON file already covers
+        self.compacted_log: Optional[Dict] = None
+        if os.path.exists(self.database_path):
+            try:
+                foods, self.compacted_log, _ = read_database(self.database_path)
+            except ValueError as e:
+                raise ValueError(f"{self.database_path} is not a valid JSON database: {e}") from e
+            self.store = NutrientStore.from_foods(foods)
+        else:
+            self.store = NutrientStore()
+        self.store.extend(self.log.added_foods(self.compacted_log))
+        if self.log.entries:
+            print(f"Replayed {self.log.entries} logged changes from {self.log.path}")
+        self._build_name_index()
+
+    def _build_name_index(self) -> None:
+        """Map each normalized name to its first row for O(1) lookups."""
+        self.ids_by_name = {}
+        for food_id, name in enumerate(self.store.names):
+            self.ids_by_name.setdefault(normalize_name(name), food_id)
 
     def save_database(self) -> None:
-        """Save the food database to JSON file."""
+        """Compact the database: rewrite the JSON file with every food and clear the mutation log."""
         try:
             # Create backup before saving
             self._create_backup()
             
-            with open(self.database_path, 'w', encoding='utf-8') as file:
-                json.dump({"foods": self.foods}, file, indent=2, ensure_ascii=False)
+            # Write a new file and rename it over the old one, so the backup
+            # (a hard link to the old file) keeps the previous contents
+            # Recording the log checkpoint in the same write makes a crash
+            # before the log is cleared harmless: its entries are not replayed again
+            self.compacted_log = self.log.checkpoint()
+            written = write_json_atomic(self.database_path, {"foods": self.foods, "compacted_log": self.compacted_log},
+                                        ensure_ascii=False)
+            self.log.clear()
             print(f"Database saved successfully to {self.database_path}")
+            self._refresh_snapshot(fingerprint(*written))
         except Exception as e:
             print(f"Error saving database: {str(e)}")
 
+    def compact(self) -> None:
+        """Fold the mutation log into the JSON database (alias of save_database)."""
+        self.save_database()
+
+    def _refresh_snapshot(self, source: Dict) -> None:
+        """Recompile the servers' binary snapshot, if one is in use, to match the JSON.
+
+        `source` is the fingerprint of the JSON file this store was written
+        to; the path may already hold another writer's file.
+        """
+        snapshot_path = snapshot_path_for(self.database_path)
+        if os.path.exists(snapshot_path):
+            compile_snapshot(self.store, snapshot_path, source, self.compacted_log)
+            print(f"Snapshot refreshed: {snapshot_path}")
+
     def _create_backup(self) -> None:
-        """Create a backup of the current database."""
+        """Back up the current database as a hard link and rotate old backups."""
         if os.path.exists(self.database_path):
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             backup_path = f"{self.database_path}.{timestamp}.bak"
             try:
-                with open(self.database_path, 'r', encoding='utf-8') as src:
-                    with open(backup_path, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
+                # The database is replaced by rename, never rewritten in place,
+                # so a link preserves the old contents without copying them
+                try:
+                    os.link(self.database_path, backup_path)
+                except OSError:
+                    shutil.copy2(self.database_path, backup_path)
                 print(f"Backup created: {backup_path}")
             except Exception as e:
                 print(f"Error creating backup: {str(e)}")
+            self._rotate_backups()
+
+    def _rotate_backups(self) -> None:
+        """Delete all but the newest MAX_BACKUPS backups."""
+        # Timestamps sort chronologically
+        backups = sorted(glob.glob(f"{glob.escape(self.database_path)}.*.bak"))
+        for backup_path in backups[:-MAX_BACKUPS]:
+            try:
+                os.remove(backup_path)
+            except OSError as e:
+                print(f"Error removing old backup {backup_path}: {str(e)}")
 
     def validate_food_item(self, food_item: Dict) -> List[str]:
         """Validate a food item and return list of errors if any."""
-        errors = []
-        
-        # Required fields
-        required_fields = [
-            "name", "calories", "protein", "carbs", "fat", "fiber",
-            "serving_size", "serving_unit", "acidity_level", "category",
-            "health_benefits", "allergens"
-        ]
-        
-        for field in required_fields:
-            if field not in food_item:
-                errors.append(f"Missing required field: {field}")
-        
-        # Validate numeric fields
-        numeric_fields = ["calories", "protein", "carbs", "fat", "fiber", "serving_size", "acidity_level"]
-        for field in numeric_fields:
-            if field in food_item and not isinstance(food_item[field], (int, float)):
-                errors.append(f"{field} must be a number")
-        
-        # Validate serving_unit
-        if "serving_unit" in food_item and not isinstance(food_item["serving_unit"], str):
-            errors.append("serving_unit must be a string")
-        
-        # Validate health_benefits
-        if "health_benefits" in food_item:
-            if not isinstance(food_item["health_benefits"], list):
-                errors.append("health_benefits must be a list")
-            elif not all(isinstance(benefit, str) for benefit in food_item["health_benefits"]):
-                errors.append("All health benefits must be strings")
-        
-        # Validate allergens
-        if "allergens" in food_item:
-            if not isinstance(food_item["allergens"], list):
-                errors.append("allergens must be a list")
-            else:
-                for allergen in food_item["allergens"]:
-                    if not isinstance(allergen, dict):
-                        errors.append("Each allergen must be a dictionary")
-                    elif "name" not in allergen or "definite" not in allergen:
-                        errors.append("Each allergen must have 'name' and 'definite' fields")
-                    elif not isinstance(allergen["name"], str):
-                        errors.append("Allergen name must be a string")
-                    elif not isinstance(allergen["definite"], bool):
-                        errors.append("Allergen definite must be a boolean")
-        
-        return errors
+        return [error for errors in FOOD_SCHEMA.errors(food_item).values() for error in errors]
+
+    def validate_food_items(self, food_items: Sequence[Dict], workers: Optional[int] = None) -> List[RecordErrors]:
+        """Validate many food items in one pass; returns the invalid ones with their errors by field."""
+        return validate_batch(food_items, workers)
 
     def add_food_items(self, new_items: List[Dict]) -> Dict[str, Union[int, List[str]]]:
         """Add new food items to the database with validation."""
-        added_count = 0
+        return self.bulk_insert(new_items)
+
+    def bulk_insert(self, items: Iterable[Dict]) -> Dict[str, Union[int, List[str]]]:
+        """
+        Validate, dedupe and persist a batch of food items in a single pass.
+        
+        Duplicates (case- and whitespace-insensitive) are found with the
+        normalized-name index, against both the database and earlier items of
+        the same batch. Accepted items are written to the mutation log together.
+        """
+        added = []
+        duplicate_count = 0
         errors = []
         
-        for item in new_items:
+        for item in items:
+            name = item.get("name") if isinstance(item, dict) else None
+            if not isinstance(name, str):
+                errors.append(f"Item without a valid name: {str(item)[:80]}")
+                continue
+            
             # Check for duplicates
-            if any(food["name"].lower() == item["name"].lower() for food in self.foods):
-                errors.append(f"Duplicate item found: {item['name']}")
+            key = normalize_name(name)
+            if key in self.ids_by_name:
+                duplicate_count += 1
+                errors.append(f"Duplicate item found: {name}")
                 continue
             
             # Validate the item
-            validation_errors = self.validate_food_item(item)
+            validation_errors = FOOD_SCHEMA.errors(item)
             if validation_errors:
-                errors.extend([f"{item['name']}: {error}" for error in validation_errors])
+                errors.extend([f"{name}: {error}" for field_errors in validation_errors.values()
+                               for error in field_errors])
                 continue
             
             # Add the item
-            self.foods.append(item)
-            added_count += 1
+            self.ids_by_name[key] = self.store.append(item)
+            added.append(item)
         
-        if added_count > 0:
-            self.save_database()
+        # Persist just this batch; the full JSON is only rewritten on compaction
+        if added:
+            self.log.append_foods(added)
+            if self.log.entries >= self.compact_threshold:
+                self.compact()
         
         return {
-            "added_count": added_count,
+            "added_count": len(added),
+            "duplicate_count": duplicate_count,
             "errors": errors
         }
 
     def get_food_by_name(self, name: str) -> Optional[Dict]:
         """Get a food item by name (case-insensitive)."""
-        for food in self.foods:
-            if food["name"].lower() == name.lower():
-                return food
-        return None
+        food_id = self.ids_by_name.get(normalize_name(name))
+        return None if food_id is None else self.store.record(food_id)
 
     def get_foods_by_category(self, category: str) -> List[Dict]:
         """Get all food items in a specific category (case-insensitive)."""
-        return [food for food in self.foods if food["category"].lower() == category.lower()]
+        return list(self.store.records(self.store.category_rows([category])))
 
     def get_total_food_count(self) -> int:
         """Get the total number of food items in the database."""
-        return len(self.foods)
+        return len(self.store)
 
     def get_categories(self) -> List[str]:
         """Get a list of all unique categories in the database."""
-        return sorted(set(food["category"] for food in self.foods))
+        return sorted(self.store.category_counts())
 
 def main():
     # Example usage
@@ -0,0 +1,216 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+import heapq
+from functools import lru_cache
+from itertools import islice
+from typing import AbstractSet, Collection, Dict, List, Optional, Sequence, Tuple
+
+
+def tokenize(name: str) -> List[str]:
+    """Split a food name into lowercase whitespace-delimited tokens."""
+    return name.lower().split()
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a food name for exact, case-insensitive lookups."""
+    return " ".join(tokenize(name))
+
+
+class FoodIndex:
+    """In-memory search structures over the food names, built once at load time.
+
+    Foods are referred to by their position in the list the index was built
+    from, so callers map the returned IDs back to their own records.
+    """
+
+    def __init__(self, names: Sequence[str]):
+        # Normalized names; collapsing whitespace never changes which
+        # (whitespace-free) query words a name contains.
+        names = [normalize_name(name) for name in names]
+
+        # Inverted index: token -> sorted list of food IDs containing it
+        postings = defaultdict(list)
+        for food_id, name in enumerate(names):
+            for token in set(name.split()):
+                postings[token].append(food_id)
+
+        # Names sorted for prefix lookups with bisect (ties in database order)
+        sorted_name_ids = sorted(range(len(names)), key=lambda food_id: (names[food_id], food_id))
+        self._setup(names, dict(postings), sorted(postings), sorted_name_ids)
+
+    @classmethod
+    def from_precomputed(cls, names: List[str], vocabulary: List[str], posting_offsets: Sequence[int],
+                         posting_ids: Sequence[int], sorted_name_ids: Sequence[int]) -> "FoodIndex":
+        """Rebuild an index from the arrays stored in a database snapshot.
+
+        `names` must already be normalized, and the postings of
+        `vocabulary[i]` are `posting_ids[posting_offsets[i]:posting_offsets[i + 1]]`.
+        """
+        ids = list(posting_ids)
+        offsets = list(posting_offsets)
+        postings = {token: ids[offsets[i]:offsets[i + 1]] for i, token in enumerate(vocabulary)}
+        index = cls.__new__(cls)
+        index._setup(names, postings, vocabulary, list(sorted_name_ids))
+        return index
+
+    def _setup(self, names: List[str], postings: Dict[str, List[int]], vocabulary: List[str],
+               sorted_name_ids: List[int]) -> None:
+        self.names = names
+        self.postings = postings
+        self.vocabulary = vocabulary
+        self._ids_containing = lru_cache(maxsize=4096)(self._ids_containing)
+        self._ids_with_token_prefix = lru_cache(maxsize=4096)(self._ids_with_token_prefix)
+
+        # Normalized name -> first food ID with that name, for exact lookups
+        # (built in reverse so the earliest duplicate wins)
+        self.by_name: Dict[str, int] = dict(zip(reversed(names), range(len(names) - 1, -1, -1)))
+
+        self._sorted_name_ids = sorted_name_ids
+        self._sorted_names = [names[food_id] for food_id in sorted_name_ids]
+
+        # IDs ordered by (name length, ID), the order within a relevance tier,
+        # and each ID's position in it
+        lengths = [len(name) for name in names]
+        self._by_length = sorted(range(len(names)), key=lengths.__getitem__)
+        self._length_rank = [0] * len(names)
+        for position, food_id in enumerate(self._by_length):
+            self._length_rank[food_id] = position
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _ids_containing(self, word: str) -> List[int]:
+        """Sorted IDs of foods with a token containing `word` as a substring."""
+        # Query words never contain whitespace, so `word in name` holds exactly
+        # when some whitespace-delimited token of the name contains it. The
+        # vocabulary is far smaller than the database, so scan it instead.
+        matching = [token for token in self.vocabulary if word in token]
+        if len(matching) == 1:
+            return self.postings[matching[0]]
+        ids = set()
+        for token in matching:
+            ids.update(self.postings[token])
+        return sorted(ids)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Return the ID of the food with exactly this name (case-insensitive), if any."""
+        return self.by_name.get(normalize_name(name))
+
+    def _prefix_range(self, keys: List[str], prefix: str) -> range:
+        """Range of positions in the sorted `keys` that start with `prefix`."""
+        return range(bisect_left(keys, prefix), bisect_right(keys, prefix + "\uffff"))
+
+    def _ids_with_token_prefix(self, prefix: str) -> frozenset:
+        """IDs of foods with a token starting with `prefix`."""
+        ids = set()
+        for position in self._prefix_range(self.vocabulary, prefix):
+            ids.update(self.postings[self.vocabulary[position]])
+        return frozenset(ids)
+
+    def search(self, query: str) -> List[int]:
+        """Return IDs (in database order) of foods whose name contains every query word."""
+        words = tokenize(query)
+        if not words:
+            # Matches the old scan, where an all-whitespace query matched everything
+            return list(range(len(self.names)))
+
+        # Intersect starting from the shortest posting list; the remaining
+        # words are checked against just those candidates.
+        postings = sorted(((self._ids_containing(word), word) for word in set(words)), key=lambda p: len(p[0]))
+        candidates, _ = postings[0]
+        rest = [word for _, word in postings[1:]]
+        if not rest:
+            return list(candidates)
+        names = self.names
+        return [food_id for food_id in candidates if all(word in names[food_id] for word in rest)]
+
+    def _shortest(self, candidates: Collection[int], count: int) -> List[int]:
+        """Up to `count` of `candidates` in (name length, ID) order."""
+        if count <= 0 or not candidates:
+            return []
+        if len(candidates) * 8 < len(self.names):
+            # Sparse: rank just the candidates
+            return heapq.nsmallest(count, candidates, key=self._length_rank.__getitem__)
+        # Dense: at least one ID in eight is a candidate, so the walk stops early
+        members = candidates if isinstance(candidates, AbstractSet) else set(candidates)
+        return list(islice((food_id for food_id in self._by_length if food_id in members), count))
+
+    def ranked_search(self, query: str, offset: int = 0, limit: int = 20,
+                      within: Optional[AbstractSet[int]] = None) -> Tuple[int, List[int]]:
+        """Return the total match count and one page of IDs ordered by relevance.
+
+        Matches are the same as `search`, optionally restricted to the IDs in
+        `within` (e.g. one category). They rank exact name matches first, then
+        names starting with the query, then names where every query word starts
+        a token, then the remaining substring matches; shorter names, then
+        lower IDs, first within a tier. Like `autocomplete`, the first tiers
+        come from the sorted names and the token postings, and each later tier
+        is only ranked while the page is still short.
+        """
+        matches = self.search(query)
+        if within is not None:
+            matches = [food_id for food_id in matches if food_id in within]
+        need = offset + limit
+        query = normalize_name(query)
+        words = query.split()
+        page: List[int] = []
+
+        def allowed(ids):
+            return ids if within is None else [food_id for food_id in ids if food_id in within]
+
+        # Exact matches lead the prefix range of the sorted names, in ID order
+        prefix = self._prefix_range(self._sorted_names, query)
+        exact_end = bisect_right(self._sorted_names, query, prefix.start, prefix.stop)
+        page.extend(allowed(self._sorted_name_ids[prefix.start:exact_end]))
+        if len(page) < need:
+            starting = allowed(self._sorted_name_ids[exact_end:prefix.stop])
+            page.extend(self._shortest(starting, need - len(page)))
+        if len(page) >= need or not words:
+            return len(matches), page[offset:need]
+
+        ranked = set(self._sorted_name_ids[prefix.start:prefix.stop])
+        token_prefixed = frozenset.intersection(*(self._ids_with_token_prefix(word) for word in set(words)))
+        token_prefixed = (token_prefixed if within is None else token_prefixed & within) - ranked
+        page.extend(self._shortest(token_prefixed, need - len(page)))
+        if len(page) < need:
+            substring_only = set(matches).difference(ranked, token_prefixed)
+            page.extend(self._shortest(substring_only, need - len(page)))
+        return len(matches), page[offset:need]
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[int]:
+        """Return up to `limit` IDs completing a partially typed query.
+
+        Ranking is stable: exact name matches first, then names starting with
+        the query, then names where every query word starts one of the name's
+        words. Ties keep alphabetical order, then database order.
+        """
+        query = normalize_name(query)
+        words = query.split()
+        if not words or limit <= 0:
+            return []
+        results: List[int] = []
+        seen = set()
+
+        def take(food_id: int) -> bool:
+            if food_id not in seen:
+                seen.add(food_id)
+                results.append(food_id)
+            return len(results) >= limit
+
+        # Exact and whole-name prefix matches are contiguous in the sorted
+        # names, and an exact match sorts before any longer completion.
+        for position in self._prefix_range(self._sorted_names, query):
+            if take(self._sorted_name_ids[position]):
+                return results
+
+        # Token-prefix matches: walk the tokens completing the last (partially
+        # typed) word and keep names where the other words also start a token.
+        *others, last = words
+        required = [self._ids_with_token_prefix(word) for word in set(others)]
+        for position in self._prefix_range(self.vocabulary, last):
+            for food_id in self.postings[self.vocabulary[position]]:
+                if food_id in seen or not all(food_id in ids for ids in required):
+                    continue
+                if take(food_id):
+                    return results
+        return results
@@ -0,0 +1,179 @@
+"""Validate food records against the database schema, in batches.
+
+The schema is compiled once into a flat list of per-field checks, and every
+record is checked against all of them, so one pass reports every problem of
+every record (not just the first). Large files are split across a process
+pool.
+
+Usage:
+    python food_validation.py foods.json [--workers N] [--limit N]
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from nutrient_store import NUMERIC_FIELDS, RECORD_FIELDS
+
+# A check returns the error messages for one field value (empty when valid)
+Check = Callable[[object], List[str]]
+
+# Records per process-pool task, and the size from which a pool is worth it
+CHUNK_SIZE = 5000
+POOL_THRESHOLD = 50000
+
+
+def _string_list(field: str) -> Check:
+    def check(value) -> List[str]:
+        if not isinstance(value, list):
+            return [f"{field} must be a list"]
+        if not all(map(isinstance, value, repeat(str))):
+            return ["All health benefits must be strings" if field == "health_benefits"
+                    else f"All {field} must be strings"]
+        return []
+    return check
+
+
+def _allergen_list(field: str) -> Check:
+    def check(value) -> List[str]:
+        if not isinstance(value, list):
+            return [f"{field} must be a list"]
+        errors = []
+        for allergen in value:
+            if not isinstance(allergen, dict):
+                errors.append("Each allergen must be a dictionary")
+            elif "name" not in allergen or "definite" not in allergen:
+                errors.append("Each allergen must have 'name' and 'definite' fields")
+            elif not isinstance(allergen["name"], str):
+                errors.append("Allergen name must be a string")
+            elif not isinstance(allergen["definite"], bool):
+                errors.append("Allergen definite must be a boolean")
+        return errors
+    return check
+
+
+class Schema:
+    """Required fields, plain type checks and custom checks, compiled into flat tuples.
+
+    `types` maps a field to (accepted types, description), e.g.
+    ((int, float), "a number"); `checks` maps a field to a factory returning
+    its Check. Type checks run before custom checks.
+    """
+
+    def __init__(self, required: Sequence[str], types: Dict[str, Tuple[Tuple[type, ...], str]],
+                 checks: Dict[str, Callable[[str], Check]]):
+        self.required = tuple(required)
+        self._required_set = frozenset(required)
+        self.types: Tuple[Tuple[str, Tuple[type, ...], str], ...] = tuple(
+            (field, accepted, f"{field} must be {description}") for field, (accepted, description) in types.items()
+        )
+        self.checks: Tuple[Tuple[str, Check], ...] = tuple(
+            (field, make_check(field)) for field, make_check in checks.items()
+        )
+
+    def errors(self, record) -> Dict[str, List[str]]:
+        """Messages for every problem in `record` by field (missing fields first); empty if valid.
+
+        Record-level problems are reported under the "" field.
+        """
+        if not isinstance(record, dict):
+            return {"": ["Record must be an object"]}
+        errors = {}
+        # The subset test against the keys runs in C; most records miss nothing
+        if not self._required_set.issubset(record.keys()):
+            for field in self.required:
+                if field not in record:
+                    errors[field] = [f"Missing required field: {field}"]
+        for field, accepted, message in self.types:
+            if field in record and not isinstance(record[field], accepted):
+                errors[field] = [message]
+        for field, check in self.checks:
+            if field in record:
+                messages = check(record[field])
+                if messages:
+                    errors[field] = messages
+        return errors
+
+
+FOOD_SCHEMA = Schema(
+    required=RECORD_FIELDS,
+    types={
+        **{field: ((int, float), "a number") for field in NUMERIC_FIELDS},
+        "serving_unit": ((str,), "a string"),
+    },
+    checks={
+        "health_benefits": _string_list,
+        "allergens": _allergen_list,
+    },
+)
+
+
+class RecordErrors(NamedTuple):
+    """The problems of one invalid record, grouped by field."""
+    index: int
+    name: Optional[str]
+    fields: Dict[str, List[str]]
+
+
+def validate_records(records: Iterable, schema: Schema = FOOD_SCHEMA, start: int = 0) -> List[RecordErrors]:
+    """Check every record in one pass and return the invalid ones, by position."""
+    invalid = []
+    for index, record in enumerate(records, start):
+        errors = schema.errors(record)
+        if errors:
+            name = record.get("name") if isinstance(record, dict) else None
+            invalid.append(RecordErrors(index, name if isinstance(name, str) else None, errors))
+    return invalid
+
+
+def _validate_chunk(task: Tuple[int, List]) -> List[RecordErrors]:
+    start, records = task
+    return validate_records(records, FOOD_SCHEMA, start)
+
+
+def validate_batch(records: Sequence, workers: Optional[int] = None) -> List[RecordErrors]:
+    """Validate a list of records, over a process pool when it is large.
+
+    With one worker (the default on a single CPU) or under POOL_THRESHOLD
+    records this validates in-process; otherwise chunks of CHUNK_SIZE records
+    go to `workers` processes (default: one per CPU).
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(records) < POOL_THRESHOLD:
+        return validate_records(records)
+    tasks = [(start, records[start:start + CHUNK_SIZE]) for start in range(0, len(records), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [errors for chunk in pool.map(_validate_chunk, tasks) for errors in chunk]
+
+
+def main():
+    # read_foods pulls in the snapshot module; only the CLI needs it
+    from snapshot import read_foods
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="JSON file of foods (default: food_database.json)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"processes for files of {POOL_THRESHOLD}+ records (default: CPU count)")
+    parser.add_argument("--limit", type=int, default=50, help="invalid records to print (0 for all)")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_database.json')
+    records = read_foods(path)
+    invalid = validate_batch(records, args.workers)
+
+    for record in invalid[:args.limit or None]:
+        print(f"#{record.index} {record.name or '<unnamed>'}")
+        for field, messages in record.fields.items():
+            for message in messages:
+                print(f"    {field or '<record>'}: {message}")
+    if args.limit and len(invalid) > args.limit:
+        print(f"... {len(invalid) - args.limit} more invalid records")
+    print(f"{len(records) - len(invalid)} of {len(records)} records valid")
+    sys.exit(1 if invalid else 0)
+
+
+if __name__ == "__main__":
+    main()
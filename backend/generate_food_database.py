@@ -1,7 +1,6 @@
-import json
 import random
-import os
 from tqdm import tqdm
+from storage import write_json_atomic
 
 # Base food categories and their typical nutritional profiles
 FOOD_CATEGORIES = {
@@ -364,8 +363,7 @@ def generate_food_database(num_entries=10000):
 
 def save_food_database(food_database, filename="food_database.json"):
     """Save the food database to a JSON file"""
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(food_database, f, indent=2)
+    write_json_atomic(filename, food_database)
     print(f"Saved food database to {filename}")
 
 if __name__ == "__main__":
@@ -1,4 +1,3 @@
-import json
 import random
 from typing import List, Dict
 import time
@@ -6,6 +5,8 @@ import os
 from concurrent.futures import ProcessPoolExecutor
 import math
 
+from storage import write_json_atomic
+
 # Common food items with accurate nutritional values
 COMMON_FOODS = {
     "Hamburger": {
@@ -400,8 +401,7 @@ def main():
         
         print("\nSaving database to file...")
         output_file = "food_database.json"
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(foods, f, indent=2)
+        write_json_atomic(output_file, foods)
         
         total_time = time.time() - start_time
         final_msg = (
@@ -2,6 +2,7 @@ import json
 import random
 import os
 from tqdm import tqdm
+from storage import write_json_atomic
 
 # Coffee types and variations
 COFFEE_TYPES = [
@@ -307,8 +308,7 @@ def merge_with_existing_database(new_entries, existing_database_path):
     
     # Save the updated database
     print("Saving updated database...")
-    with open(existing_database_path, 'w', encoding='utf-8') as f:
-        json.dump(existing_database, f, indent=2)
+    write_json_atomic(existing_database_path, existing_database)
     
     print(f"Database updated successfully! Total foods: {len(existing_database['foods'])}")
 
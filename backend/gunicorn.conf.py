@@ -1,3 +1,4 @@
+import gc
 import os
 
 # Bind to the port Render provides
@@ -9,6 +10,17 @@ workers = 4
 worker_class = "sync"
 threads = 2
 
+# Load the app (database, snapshot mapping and search indexes) once in the
+# master and fork workers from it, so they share those pages copy-on-write.
+# Set GUNICORN_PRELOAD=0 to fall back to loading the app in every worker.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+def pre_fork(server, worker):
+    # Move everything loaded so far into the permanent generation; otherwise
+    # the first collection in a worker writes to every object header and
+    # un-shares the pages.
+    gc.freeze()
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -16,4 +28,4 @@ loglevel = "info"
 
 # Timeout configuration
 timeout = 120
-keepalive = 5 
\ No newline at end of file
+keepalive = 5 
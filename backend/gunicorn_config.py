@@ -1,5 +1,15 @@
+import gc
+import os
+
 bind = "0.0.0.0:10000"
 workers = 4
 threads = 4
 worker_class = "gthread"
-timeout = 120 
\ No newline at end of file
+timeout = 120
+
+# Build the database and indexes once in the master and share them with the
+# forked workers (see gunicorn.conf.py)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+def pre_fork(server, worker):
+    gc.freeze()
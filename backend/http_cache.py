@@ -0,0 +1,173 @@
+"""On-disk cache of raw USDA API responses, shared by the ingestion scripts.
+
+An entry is the response body, stored under the SHA-256 of the request
+(method, endpoint, query parameters and JSON body, without the API key).
+Identical requests from any script or run therefore hit the same file, so a
+rerun after a crash, or after a change to the converters, needs no network.
+Entries expire `ttl` seconds after they were fetched, and the least recently
+used entries are evicted once the cache grows beyond `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from storage import atomic_open
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.usda_cache')
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Fraction of max_bytes a full cache is evicted down to
+LOW_WATER = 0.9
+
+# Never part of a cache key: the same request made with another key is the same request
+SECRET_PARAMS = ("api_key",)
+
+
+class HTTPCache:
+    """Response bodies by request, with a TTL (0 for none) and a size bound.
+
+    The fetch time is an entry's mtime. Recency of use is kept in an
+    in-memory LRU index, built by one scan of the directory on the first
+    write (ordered by atime, which `get` updates explicitly), so eviction
+    never rescans. Past `max_bytes`, entries are evicted down to
+    `low_water` of it, so a full cache evicts in batches rather than once
+    per write.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES, low_water: float = LOW_WATER):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        # Entry size by key, least recently used first; None until the first write
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "HTTPCache":
+        """A cache configured by USDA_CACHE_DIR, USDA_CACHE_TTL (seconds) and USDA_CACHE_MAX_MB."""
+        return cls(
+            os.getenv('USDA_CACHE_DIR', DEFAULT_DIRECTORY),
+            float(os.getenv('USDA_CACHE_TTL', DEFAULT_TTL)),
+            int(float(os.getenv('USDA_CACHE_MAX_MB', DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        )
+
+    @staticmethod
+    def key(method: str, endpoint: str, params: Optional[Dict] = None, body=None) -> str:
+        """Content address of a request; `endpoint` is the path below the API base URL."""
+        params = {name: value for name, value in (params or {}).items() if name not in SECRET_PARAMS}
+        request = [method.upper(), endpoint, params, body]
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, method: str, endpoint: str, params: Optional[Dict] = None, body=None) -> Optional[bytes]:
+        """The cached response body of a request, or None if missing or expired."""
+        key = self.key(method, endpoint, params, body)
+        path = self._path(key)
+        try:
+            info = os.stat(path)
+            now = time.time()
+            if self.ttl > 0 and now - info.st_mtime > self.ttl:
+                with self._lock:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                content = f.read()
+            os.utime(path, (now, info.st_mtime))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        with self._lock:
+            if self._index is not None and key in self._index:
+                self._index.move_to_end(key)
+        self.hits += 1
+        return content
+
+    def get_json(self, method: str, endpoint: str, params: Optional[Dict] = None, body=None):
+        """The cached response of a request decoded as JSON, or None."""
+        content = self.get(method, endpoint, params, body)
+        return None if content is None else json.loads(content)
+
+    def put(self, method: str, endpoint: str, params: Optional[Dict], body, content: bytes) -> None:
+        """Store the response body of a successful request."""
+        key = self.key(method, endpoint, params, body)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            index = self._load_index()
+            with atomic_open(path, 'wb') as f:
+                f.write(content)
+            self._size += len(content) - index.pop(key, 0)
+            index[key] = len(content)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        """The LRU index, scanning the directory the first time."""
+        if self._index is None:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            self._index = OrderedDict((key, size) for key, size, _ in entries)
+            self._size = sum(self._index.values())
+        return self._index
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """(key, size, last use) of every entry on disk."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            for entry in os.scandir(prefix.path):
+                if entry.name.endswith('.json'):
+                    info = entry.stat()
+                    entries.append((entry.name[:-len('.json')], info.st_size, info.st_atime))
+        return entries
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        if self._index is not None:
+            self._size -= self._index.pop(key, 0)
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries until the cache is down to its low-water mark."""
+        target = self.max_bytes * self.low_water
+        while self._index and self._size > target:
+            key = next(iter(self._index))
+            self._remove(key)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key, _, _ in self._entries():
+                self._remove(key)
+            self._index, self._size = OrderedDict(), 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            index = self._load_index()
+            return {
+                "entries": len(index),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
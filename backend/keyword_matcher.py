@@ -0,0 +1,71 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Set, Tuple
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton reporting every keyword found in a text in one pass.
+
+    Each keyword carries a label (e.g. the allergen it indicates), and a scan
+    returns the labels of all keywords occurring anywhere in the text,
+    including overlapping ones ("hot chocolate" and "chocolate").
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]]):
+        # Trie of keyword characters; state 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._output: List[Set[Hashable]] = [set()]
+        for keyword, label in keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._output.append(set())
+                state = next_state
+            self._output[state].add(label)
+
+        # Failure links point to the longest proper suffix that is also a
+        # trie prefix; outputs are merged along them so a scan only needs to
+        # look at the current state.
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] |= self._output[self._fail[next_state]]
+
+        # Freeze outputs so scans can share them safely
+        self._output = [frozenset(labels) for labels in self._output]
+
+    def labels(self, text: str) -> Set[Hashable]:
+        """Return the labels of every keyword occurring in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+    def matches(self, text: str) -> bool:
+        """Return True if any keyword occurs in `text`."""
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
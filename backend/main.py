@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import json
-from typing import Optional, List
-from pydantic import BaseModel
+from typing import Any, Dict, Optional, List
+from pydantic import BaseModel, Field
 import os
 import uvicorn
+import numpy as np
+from food_index import FoodIndex
+from mutation_log import MutationLog, log_path_for
+from nutrient_store import NutrientStore
+from nutrition import macronutrient_ratios, nutrient_totals, scaled_nutrients
+from snapshot import load_snapshot, snapshot_path_for
 
 app = FastAPI()
 
@@ -18,19 +24,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load food database
+# Load food database, mapping the compiled snapshot when it is current
 current_dir = os.path.dirname(os.path.abspath(__file__))
 database_path = os.path.join(current_dir, 'food_database.json')
-try:
-    with open(database_path, 'r', encoding='utf-8') as f:
-        food_database = json.load(f)
-    print(f"Successfully loaded {len(food_database['foods'])} foods from database")
-except FileNotFoundError:
-    print(f"Error: food_database.json not found at {database_path}")
-    food_database = {"foods": []}
-except json.JSONDecodeError:
-    print("Error: Invalid JSON in food_database.json")
-    food_database = {"foods": []}
+loaded = load_snapshot(snapshot_path_for(database_path), database_path)
+if loaded:
+    food_store, food_index, header = loaded
+    compacted_log = header["compacted_log"]
+    print(f"Successfully mapped {len(food_store)} foods from snapshot")
+else:
+    try:
+        with open(database_path, 'r', encoding='utf-8') as f:
+            food_database = json.load(f)
+        print(f"Successfully loaded {len(food_database['foods'])} foods from database")
+    except FileNotFoundError:
+        print(f"Error: food_database.json not found at {database_path}")
+        food_database = {"foods": []}
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON in food_database.json")
+        food_database = {"foods": []}
+
+    compacted_log = food_database.get("compacted_log") if isinstance(food_database, dict) else None
+
+    # Keep the foods in columnar form; the parsed JSON dicts are dropped
+    food_store = NutrientStore.from_foods(food_database["foods"])
+    del food_database
+    food_index = FoodIndex(food_store.names)
+
+# Replay foods added since the database was last compacted
+pending_foods = MutationLog(log_path_for(database_path)).added_foods(compacted_log)
+if pending_foods:
+    food_store.extend(pending_foods)
+    food_index = FoodIndex(food_store.names)
+    print(f"Replayed {len(pending_foods)} foods from the mutation log")
 
 class FoodItem(BaseModel):
     name: str
@@ -67,9 +93,9 @@ async def search_foods(query: str) -> List[FoodItem]:
     query = query.lower()
     matches = []
     
-    for food in food_database["foods"]:
-        if query in food["name"].lower():
-            matches.append(FoodItem(**food))
+    for food_id, name in enumerate(food_index.names):
+        if query in name:
+            matches.append(FoodItem(**food_store.record(food_id)))
             if len(matches) >= 10:  # Limit results to 10 items
                 break
     
@@ -79,15 +105,13 @@ async def search_foods(query: str) -> List[FoodItem]:
 async def get_nutrition(query: str, quantity: float, unit: str) -> SearchResult:
     """Get nutritional information for a specific food item"""
     # Find the food item in the database
-    food_item = None
-    for food in food_database["foods"]:
-        if food["name"].lower() == query.lower():
-            food_item = food
-            break
+    food_id = food_index.lookup(query)
     
-    if not food_item:
+    if food_id is None:
         raise HTTPException(status_code=404, detail="Food item not found")
     
+    food_item = food_store.record(food_id)
+    
     # Calculate nutritional values based on quantity
     serving_size = food_item["serving_size"]
     serving_unit = food_item["serving_unit"]
@@ -123,6 +147,63 @@ async def get_nutrition(query: str, quantity: float, unit: str) -> SearchResult:
     
     return SearchResult(**result)
 
+class NutritionRequestItem(BaseModel):
+    query: str
+    # NaN and infinity would yield null nutrients and NaN totals
+    quantity: float = Field(allow_inf_nan=False)
+    unit: str
+
+class BatchNutritionRequest(BaseModel):
+    items: List[NutritionRequestItem]
+
+# Largest number of items accepted by one batch request
+MAX_BATCH_ITEMS = 100
+
+@app.post("/api/nutrition/batch")
+async def get_nutrition_batch(request: BatchNutritionRequest) -> Dict[str, Any]:
+    """Get nutritional information for every item of a meal or recipe at once"""
+    if not request.items or len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {MAX_BATCH_ITEMS} items")
+    
+    # Resolve every item against the index, keeping per-item errors
+    results: List[Dict[str, Any]] = [{"query": item.query} for item in request.items]
+    positions, food_ids, quantities = [], [], []
+    for position, item in enumerate(request.items):
+        food_id = food_index.lookup(item.query)
+        if food_id is None:
+            results[position]["error"] = "Food item not found"
+            continue
+        serving_unit = food_store.record(food_id, ("serving_unit",)).get("serving_unit")
+        # g and ml convert 1:1 for water-based foods; anything else cannot be scaled
+        if item.unit != serving_unit and {item.unit, serving_unit} != {"g", "ml"}:
+            results[position]["error"] = f"Cannot convert between {item.unit} and {serving_unit}"
+            continue
+        positions.append(position)
+        food_ids.append(food_id)
+        quantities.append(item.quantity)
+    
+    # Scale all resolved items in one vectorized pass
+    factors = np.asarray(quantities, dtype=np.float64) / food_store.values("serving_size", food_ids)
+    nutrients = scaled_nutrients(food_store, food_ids, factors)
+    ratios = macronutrient_ratios(nutrients)
+    for row, (position, food_id) in enumerate(zip(positions, food_ids)):
+        food_item = food_store.record(food_id)
+        item = request.items[position]
+        result = SearchResult(
+            name=food_item["name"],
+            serving_size=item.quantity,
+            serving_unit=item.unit,
+            acidity_level=food_item["acidity_level"],
+            category=food_item["category"],
+            health_benefits=food_item.get("health_benefits", []),
+            **{field: float(values[row]) for field, values in nutrients.items()}
+        )
+        results[position]["result"] = result.model_dump()
+        if ratios[row] is not None:
+            results[position]["result"]["macronutrient_ratios"] = ratios[row]
+    
+    return {"items": results, "totals": nutrient_totals(nutrients)}
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port) 
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""Measure per-worker memory of the Gunicorn app with and without preloading.
+
+Starts gunicorn twice (GUNICORN_PRELOAD=0, then 1), waits for the workers to
+come up and answer a request, and reads /proc/<pid>/smaps_rollup for each
+worker. RSS counts shared pages in every worker; PSS splits them between the
+processes sharing them, and "private" is what each worker holds alone.
+
+Usage:
+    python measure_worker_rss.py [--database food_database.json] [--config gunicorn.conf.py]
+
+Linux only (uses /proc).
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def read_smaps_rollup(pid):
+    """Return the smaps_rollup fields of a process in kB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def child_pids(parent_pid):
+    """PIDs of the direct children of a process."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces; the ppid follows the closing paren
+        if int(stat.rsplit(")", 1)[1].split()[1]) == parent_pid:
+            children.append(int(entry))
+    return children
+
+
+def wait_until_serving(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def measure(preload, args):
+    env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0", PORT=str(args.port))
+    if args.database:
+        env["FOOD_DATABASE_PATH"] = os.path.abspath(args.database)
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", args.config, "test:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_until_serving(args.port, args.timeout):
+            raise RuntimeError("gunicorn did not start serving in time")
+        # Let every worker finish booting and touch the data once
+        time.sleep(args.settle)
+        for _ in range(20):
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/api/search?query=a&fields=name").read()
+        return [read_smaps_rollup(pid) for pid in child_pids(master.pid)]
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="JSON database to serve (default: food_database.json)")
+    parser.add_argument("--config", default="gunicorn.conf.py")
+    parser.add_argument("--port", type=int, default=18765)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--settle", type=float, default=3)
+    args = parser.parse_args()
+
+    print(f"{'mode':<10} {'workers':>7} {'RSS MB':>8} {'PSS MB':>8} {'private MB':>10}")
+    for preload in (False, True):
+        workers = measure(preload, args)
+        count = len(workers) or 1
+        rss = sum(w.get("Rss", 0) for w in workers) / count / 1024
+        pss = sum(w.get("Pss", 0) for w in workers) / count / 1024
+        private = sum(w.get("Private_Clean", 0) + w.get("Private_Dirty", 0) for w in workers) / count / 1024
+        print(f"{'preload' if preload else 'per-worker':<10} {len(workers):>7} {rss:>8.1f} {pss:>8.1f} {private:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import json
+from storage import write_json_atomic
 
 def merge_databases():
     # Read the complete database
@@ -17,9 +18,8 @@ def merge_databases():
         if food['name'] not in existing_foods:
             current_data['foods'].append(food)
     
-    # Write back to food_database.json
-    with open('food_database.json', 'w') as f:
-        json.dump(current_data, f, indent=2)
+    # Write back to food_database.json (atomically, servers may be reading it)
+    write_json_atomic('food_database.json', current_data)
 
 if __name__ == '__main__':
     merge_databases()
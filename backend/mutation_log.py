@@ -0,0 +1,123 @@
+"""Append-only log of database mutations made since the JSON file was last compacted.
+
+Each line is one JSON object, currently always {"op": "add", "food": {...}},
+after a first {"op": "begin", "generation": ...} line that identifies this
+log among all logs ever written for the database. Writers append a whole batch and fsync it, so adding foods costs I/O
+proportional to the batch, not the database. Readers (the manager and the
+servers) replay the log on top of the JSON database; compaction folds it
+into a rewritten JSON file and deletes it. The JSON file records the
+generation and entry count it covers (see `checkpoint`), so a crash between
+the rewrite and the delete does not replay those entries a second time.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+
+def log_path_for(database_path: str) -> str:
+    """Default mutation log location next to a JSON database."""
+    return os.path.splitext(database_path)[0] + ".log"
+
+
+class MutationLog:
+    def __init__(self, path: str):
+        self.path = path
+        # Entries currently in the log, counted on read and append
+        self.entries = 0
+        # Content hash of the log as last read (None when empty)
+        self.digest: Optional[str] = None
+        # Identifier from the log's begin line (None when empty or written before generations)
+        self.generation: Optional[str] = None
+
+    def read(self) -> List[Dict]:
+        """Return the logged operations in order.
+
+        A torn final line (a crash mid-append) is ignored; that batch was
+        never acknowledged to the caller.
+        """
+        operations = []
+        self.entries, self.digest, self.generation = 0, None, None
+        if not os.path.exists(self.path):
+            return operations
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+        if raw:
+            self.digest = hashlib.sha256(raw).hexdigest()
+        lines = raw.decode('utf-8').split("\n")
+        for number, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                operation = json.loads(line)
+            except json.JSONDecodeError:
+                if number < len(lines) - 1 and any(rest.strip() for rest in lines[number + 1:]):
+                    raise
+                print(f"Ignoring incomplete last entry in {self.path}")
+                continue
+            if operation.get("op") == "begin" and not operations and self.generation is None:
+                self.generation = operation["generation"]
+            else:
+                operations.append(operation)
+        self.entries = len(operations)
+        return operations
+
+    def added_foods(self, compacted: Optional[Dict] = None) -> List[Dict]:
+        """Foods added by the logged operations, in order.
+
+        `compacted` is the checkpoint stored with the JSON database; entries
+        it already covers are skipped.
+        """
+        operations = self.read()
+        if compacted and self.generation is not None and compacted.get("generation") == self.generation:
+            operations = operations[compacted.get("entries", 0):]
+        return [operation["food"] for operation in operations if operation.get("op") == "add"]
+
+    def checkpoint(self) -> Optional[Dict]:
+        """What a compaction of the log as last read or written covers, to store with the JSON."""
+        if self.generation is None:
+            return None
+        return {"generation": self.generation, "entries": self.entries}
+
+    def append_foods(self, foods: Iterable[Dict]) -> None:
+        """Durably append one "add" entry per food."""
+        self.append({"op": "add", "food": food} for food in foods)
+
+    def append(self, operations: Iterable[Dict]) -> None:
+        """Durably append operations, one line each."""
+        lines = [json.dumps(operation, ensure_ascii=False) + "\n" for operation in operations]
+        if not lines:
+            return
+        self._drop_incomplete_entry()
+        begin = ""
+        if not os.path.exists(self.path) or not os.path.getsize(self.path):
+            # A new log: give it a generation no compacted JSON can already cover
+            self.generation, self.entries = uuid.uuid4().hex, 0
+            begin = json.dumps({"op": "begin", "generation": self.generation}) + "\n"
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(begin + "".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += len(lines)
+
+    def _drop_incomplete_entry(self) -> None:
+        """Truncate a torn final line so the next append starts on a fresh line."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            f.truncate(f.read().rfind(b"\n") + 1)
+
+    def clear(self) -> None:
+        """Drop every entry, after they have been compacted into the database."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.entries, self.digest, self.generation = 0, None, None
@@ -0,0 +1,56 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from nutrient_store import NutrientStore
+
+# Numeric fields that can be constrained and sorted on
+QUERY_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "acidity_level")
+
+# field -> (minimum, maximum); either bound may be None
+Ranges = Dict[str, Tuple[Optional[float], Optional[float]]]
+
+
+def allergen_codes(store: NutrientStore, allergens: Iterable[str]) -> List[int]:
+    """Codes of the detected allergen profiles containing any of `allergens` (case-insensitive)."""
+    wanted = {allergen.strip().lower() for allergen in allergens}
+    return [
+        code for code, profile in enumerate(store.tables()["detected_allergens"])
+        if any(name.lower() in wanted for name, _ in profile or ())
+    ]
+
+
+def query_mask(store: NutrientStore, ranges: Ranges, categories: Optional[Iterable[str]] = None,
+               exclude_allergens: Optional[Iterable[str]] = None) -> np.ndarray:
+    """Boolean mask of the rows satisfying every constraint, built with column-wide comparisons.
+
+    Bounds are inclusive. A food missing a constrained value never matches.
+    """
+    mask = np.ones(len(store), dtype=bool)
+    for field, (minimum, maximum) in ranges.items():
+        column = store.column(field)
+        # Compare in float32 so a bound equal to a stored value (3.8) matches it
+        if minimum is not None:
+            mask &= column >= np.float32(minimum)
+        if maximum is not None:
+            mask &= column <= np.float32(maximum)
+    if categories is not None:
+        mask &= np.isin(store.category_codes, store.category_codes_for(categories))
+    if exclude_allergens is not None:
+        mask &= ~np.isin(store.codes("detected_allergens"), allergen_codes(store, exclude_allergens))
+    return mask
+
+
+def query_foods(store: NutrientStore, ranges: Ranges, categories: Optional[Iterable[str]] = None,
+                exclude_allergens: Optional[Iterable[str]] = None, sort: Optional[str] = None,
+                descending: bool = False, offset: int = 0, limit: int = 20) -> Tuple[int, List[int]]:
+    """Return the number of matching foods and one page of their IDs.
+
+    Without `sort` the page is in database order; otherwise it is ordered by
+    that field (missing values last, ties in database order).
+    """
+    ids = np.flatnonzero(query_mask(store, ranges, categories, exclude_allergens))
+    if sort is not None:
+        values = store.column(sort)[ids]
+        ids = ids[np.argsort(-values if descending else values, kind="stable")]
+    return len(ids), ids[offset:offset + limit].tolist()
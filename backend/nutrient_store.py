@@ -0,0 +1,314 @@
+import heapq
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from food_classification import AllergenProfile, allergen_profile, is_liquid_food
+
+# Numeric fields kept as contiguous float32 columns (NaN marks a missing value)
+NUMERIC_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "serving_size", "acidity_level")
+
+# Field order used when a record is materialized back into a dict
+RECORD_FIELDS = (
+    "name", "calories", "protein", "carbs", "fat", "fiber", "serving_size",
+    "serving_unit", "acidity_level", "category", "health_benefits", "allergens"
+)
+
+# Fields stored once in a lookup table and referenced by a per-row code
+CODED_FIELDS = ("category", "serving_unit", "health_benefits", "allergens")
+
+# Coded fields computed from the food name when a row is added
+DERIVED_FIELDS = ("detected_allergens", "is_liquid")
+
+_INITIAL_CAPACITY = 1024
+
+
+def _to_python(value: np.float32):
+    """Convert a float32 cell back to the number it was stored from."""
+    # The shortest decimal that round-trips through float32 drops the binary
+    # noise (3.8 would otherwise come back as 3.799999952...).
+    value = float(str(value))
+    return int(value) if value.is_integer() else value
+
+
+def _intern(value):
+    """Intern a string cell; anything else is kept in the row's extras instead."""
+    return sys.intern(value) if isinstance(value, str) else None
+
+
+class _Table:
+    """Interned string (or tuple) values referenced by small integer codes."""
+
+    def __init__(self):
+        self.values: List = []
+        self.codes: Dict = {}
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+
+class NutrientStore:
+    """Columnar, append-only storage for the food database.
+
+    Numeric nutrients live in float32 NumPy arrays, names are interned
+    strings, and categories, serving units, health benefits and allergens are
+    stored once in lookup tables and referenced by per-row int32 codes. Foods
+    are addressed by their row ID, which matches their position in the
+    source list.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._capacity = _INITIAL_CAPACITY
+        self._columns = {field: np.full(self._capacity, np.nan, dtype=np.float32) for field in NUMERIC_FIELDS}
+        self._codes = {field: np.zeros(self._capacity, dtype=np.int32) for field in CODED_FIELDS + DERIVED_FIELDS}
+        self._tables = {field: _Table() for field in CODED_FIELDS + DERIVED_FIELDS}
+        self.names: List[str] = []
+        # Fields outside the fixed schema (vitamins, glycemic_index, ...)
+        self._extras: Dict[int, Dict] = {}
+        # Category code -> sorted row IDs in that category
+        self._category_rows: Optional[List[List[int]]] = []
+
+    @classmethod
+    def from_foods(cls, foods: Iterable[Dict]) -> "NutrientStore":
+        store = cls()
+        store.extend(foods)
+        return store
+
+    @classmethod
+    def from_arrays(cls, names: List[str], columns: Dict[str, np.ndarray], codes: Dict[str, np.ndarray],
+                    tables: Dict[str, List], extras: Dict[int, Dict]) -> "NutrientStore":
+        """Wrap existing arrays (e.g. memory-mapped from a snapshot) without copying.
+
+        The arrays may be read-only; the first append copies them into
+        private, growable buffers.
+        """
+        store = cls.__new__(cls)
+        store.size = store._capacity = len(names)
+        store.names = names
+        store._columns = dict(columns)
+        store._codes = dict(codes)
+        store._tables = {}
+        for field, values in tables.items():
+            table = store._tables[field] = _Table()
+            for value in values:
+                table.code(value)
+        store._extras = extras
+        # Group the rows by category once at load time
+        store._category_rows = None
+        store._category_row_lists()
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def categories(self) -> "_Table":
+        """Category lookup table; `category_codes` index into its values."""
+        return self._tables["category"]
+
+    def tables(self) -> Dict[str, List]:
+        """Values of each lookup table, indexed by code."""
+        return {field: table.values for field, table in self._tables.items()}
+
+    def codes(self, field: str) -> np.ndarray:
+        """Read-only view of each row's code into the `field` lookup table."""
+        view = self._codes[field][:self.size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def extras(self) -> Dict[int, Dict]:
+        """Per-row fields outside the fixed schema, keyed by row ID."""
+        return self._extras
+
+    def _grow(self, needed: int) -> None:
+        """Double the capacity until `needed` rows fit, copying into fresh buffers."""
+        capacity = max(self._capacity, _INITIAL_CAPACITY)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        for field, column in self._columns.items():
+            grown = np.full(capacity, np.nan, dtype=np.float32)
+            grown[:self.size] = column[:self.size]
+            self._columns[field] = grown
+        for field, codes in self._codes.items():
+            grown = np.zeros(capacity, dtype=np.int32)
+            grown[:self.size] = codes[:self.size]
+            self._codes[field] = grown
+        self._capacity = capacity
+
+    def append(self, food: Dict) -> int:
+        """Add a food record and return its row ID."""
+        row = self.size
+        self._grow(row + 1)
+        extras = {}
+
+        for field in NUMERIC_FIELDS:
+            value = food.get(field)
+            if value is None:
+                continue
+            try:
+                self._columns[field][row] = value
+            except (TypeError, ValueError):
+                # Keep values that are not numbers verbatim
+                extras[field] = value
+
+        self.names.append(sys.intern(food["name"]))
+        for field in ("category", "serving_unit"):
+            value = food.get(field)
+            if value is not None and not isinstance(value, str):
+                extras[field] = value
+            self._codes[field][row] = self._tables[field].code(_intern(value))
+        if self._category_rows is not None:
+            category_rows = self._category_rows
+            category_rows.extend([] for _ in range(len(self.categories.values) - len(category_rows)))
+            category_rows[self._codes["category"][row]].append(row)
+
+        benefits = food.get("health_benefits")
+        try:
+            benefits = None if benefits is None else tuple(sys.intern(benefit) for benefit in benefits)
+        except TypeError:
+            extras["health_benefits"], benefits = benefits, None
+        self._codes["health_benefits"][row] = self._tables["health_benefits"].code(benefits)
+
+        allergens = food.get("allergens")
+        try:
+            allergens = None if allergens is None else tuple(
+                (sys.intern(allergen["name"]), allergen["definite"]) for allergen in allergens
+            )
+        except (KeyError, TypeError):
+            extras["allergens"], allergens = allergens, None
+        self._codes["allergens"][row] = self._tables["allergens"].code(allergens)
+
+        profile = allergen_profile(food["name"])
+        self._codes["detected_allergens"][row] = self._tables["detected_allergens"].code(profile)
+        self._codes["is_liquid"][row] = self._tables["is_liquid"].code(is_liquid_food(food["name"]))
+
+        extras.update((key, value) for key, value in food.items() if key not in RECORD_FIELDS)
+        if extras:
+            self._extras[row] = extras
+
+        self.size += 1
+        return row
+
+    def extend(self, foods: Iterable[Dict]) -> None:
+        """Add several food records."""
+        if isinstance(foods, Sequence):
+            self._grow(self.size + len(foods))
+        for food in foods:
+            self.append(food)
+
+    def column(self, field: str) -> np.ndarray:
+        """Read-only view of a numeric column, one float32 per row."""
+        view = self._columns[field][:self.size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def category_codes(self) -> np.ndarray:
+        """Read-only view of each row's category code."""
+        return self.codes("category")
+
+    def _category_row_lists(self) -> List[List[int]]:
+        """Row IDs per category code, grouping the codes with a stable sort if needed."""
+        if self._category_rows is None:
+            codes = self.category_codes
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(self.categories.values) + 1)).tolist()
+            self._category_rows = [order[bounds[code]:bounds[code + 1]].tolist()
+                                   for code in range(len(self.categories.values))]
+        return self._category_rows
+
+    def category_codes_for(self, categories: Iterable[str]) -> List[int]:
+        """Codes of the categories named in `categories` (case-insensitive)."""
+        wanted = {category.strip().lower() for category in categories}
+        return [code for code, category in enumerate(self.categories.values)
+                if category is not None and category.lower() in wanted]
+
+    def category_rows(self, categories: Iterable[str]) -> List[int]:
+        """Sorted row IDs of foods in any of `categories` (case-insensitive)."""
+        row_lists = self._category_row_lists()
+        matching = [row_lists[code] for code in self.category_codes_for(categories)]
+        if len(matching) == 1:
+            return list(matching[0])
+        return list(heapq.merge(*matching))
+
+    def category_counts(self) -> Dict[str, int]:
+        """Number of foods per category, in O(number of categories)."""
+        return {
+            category: len(rows)
+            for category, rows in zip(self.categories.values, self._category_row_lists())
+            if category is not None and rows
+        }
+
+    def _coded(self, row: int, field: str):
+        return self._tables[field].values[self._codes[field][row]]
+
+    def category(self, row: int) -> Optional[str]:
+        return self._coded(row, "category")
+
+    def is_liquid(self, row: int) -> bool:
+        """Whether the food was classified as a liquid (served in ml) from its name."""
+        return self._coded(row, "is_liquid")
+
+    def allergen_profile(self, row: int) -> AllergenProfile:
+        """Allergens detected from the food's name when the row was added."""
+        return self._coded(row, "detected_allergens")
+
+    def value(self, row: int, field: str):
+        """Return one numeric cell as a Python number (None when missing)."""
+        value = self._columns[field][row]
+        return None if np.isnan(value) else _to_python(value)
+
+    def values(self, field: str, rows: Sequence[int]) -> np.ndarray:
+        """Numeric cells of `rows` as float64, with the same cleanup as `value`."""
+        # float32 -> shortest decimal string -> float64, vectorized
+        return self._columns[field][rows].astype(str).astype(np.float64)
+
+    def record(self, row: int, fields: Optional[Sequence[str]] = None) -> Dict:
+        """Materialize a row as a plain dict, optionally limited to `fields`."""
+        extras = self._extras.get(row, {})
+        record = {}
+        for field in fields or RECORD_FIELDS:
+            if field == "name":
+                record["name"] = self.names[row]
+            elif field == "is_liquid":
+                record["is_liquid"] = self.is_liquid(row)
+            elif field in self._columns and field not in extras:
+                value = self.value(row, field)
+                if value is not None:
+                    record[field] = value
+            elif field in extras:
+                record[field] = extras[field]
+            elif field == "category":
+                category = self.category(row)
+                if category is not None:
+                    record["category"] = category
+            elif field == "serving_unit":
+                unit = self._coded(row, "serving_unit")
+                if unit is not None:
+                    record["serving_unit"] = unit
+            elif field == "health_benefits":
+                benefits = self._coded(row, "health_benefits")
+                if benefits is not None:
+                    record["health_benefits"] = list(benefits)
+            elif field == "allergens":
+                allergens = self._coded(row, "allergens")
+                if allergens is not None:
+                    record["allergens"] = [{"name": name, "definite": definite} for name, definite in allergens]
+        if not fields:
+            record.update((key, value) for key, value in extras.items() if key not in record)
+        return record
+
+    def records(self, rows: Optional[Iterable[int]] = None) -> Iterator[Dict]:
+        """Materialize rows (all of them by default) one at a time."""
+        for row in range(self.size) if rows is None else rows:
+            yield self.record(row)
@@ -0,0 +1,97 @@
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from food_classification import profile_to_allergens
+from nutrient_store import NutrientStore
+
+# Nutrients scaled by quantity, with the decimals they are reported to
+SCALED_NUTRIENTS = {"calories": 1, "protein": 2, "carbs": 2, "fat": 2, "fiber": 2}
+
+# Calories per gram of each macronutrient, in reporting order
+MACRO_CALORIES = {"protein": 4, "carbs": 4, "fat": 9}
+
+
+def scaled_nutrients(store: NutrientStore, food_ids: Sequence[int], factors: Sequence[float]) -> Dict[str, np.ndarray]:
+    """Scale each food's nutrients by its factor, for all items at once.
+
+    Missing values count as zero. Nothing is rounded.
+    """
+    ids = np.asarray(food_ids, dtype=np.intp)
+    factors = np.asarray(factors, dtype=np.float64)
+    return {
+        field: np.nan_to_num(store.values(field, ids)) * factors
+        for field in SCALED_NUTRIENTS
+    }
+
+
+def round_nutrients(nutrients: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Round scaled nutrients to the decimals the API reports."""
+    # np.round scales by 10**decimals first and can land on the wrong side of
+    # a half (1.665 -> 1.66); the builtin rounds the exact value (1.67).
+    return {
+        field: np.array([round(value, SCALED_NUTRIENTS[field]) for value in values.tolist()], dtype=np.float64)
+        for field, values in nutrients.items()
+    }
+
+
+def macronutrient_ratios(nutrients: Dict[str, np.ndarray]) -> List[Dict]:
+    """Percent of macro calories from protein, carbs and fat for each item.
+
+    Ratios are whole numbers that sum to 100 (the largest absorbs rounding
+    error). Items without any macro calories get None.
+    """
+    energy = np.stack([nutrients[field] * kcal for field, kcal in MACRO_CALORIES.items()], axis=1)
+    total = energy.sum(axis=1)
+    valid = total > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = np.round(energy / total[:, None] * 100)
+    rows = np.arange(len(ratios))
+    ratios[rows, ratios.argmax(axis=1)] += 100 - ratios.sum(axis=1)
+
+    fields = list(MACRO_CALORIES)
+    return [
+        dict(zip(fields, (int(value) for value in row))) if is_valid else None
+        for row, is_valid in zip(ratios.tolist(), valid.tolist())
+    ]
+
+
+def nutrient_totals(nutrients: Dict[str, np.ndarray]) -> Dict:
+    """Sum scaled nutrients over all items, with the ratios of the totals."""
+    totals = {field: np.array([values.sum()]) for field, values in nutrients.items()}
+    totals = round_nutrients(totals)
+    result = {field: float(values[0]) for field, values in totals.items()}
+    ratios = macronutrient_ratios(totals)[0]
+    if ratios is not None:
+        result["macronutrient_ratios"] = ratios
+    return result
+
+
+def nutrition_facts(store: NutrientStore, food_ids: Sequence[int], quantities: Sequence[float]) -> List[Dict]:
+    """Build the /api/nutrition response for each (food, quantity in g or ml) pair."""
+    facts, _ = nutrition_batch(store, food_ids, quantities)
+    return facts
+
+
+def nutrition_batch(store: NutrientStore, food_ids: Sequence[int],
+                    quantities: Sequence[float]) -> Tuple[List[Dict], Dict]:
+    """Build per-item nutrition facts and their totals for a meal or recipe.
+
+    Nutrient values are stored per 100 g/ml, so every item is scaled by
+    quantity / 100 in one vectorized pass.
+    """
+    nutrients = round_nutrients(scaled_nutrients(store, food_ids, np.asarray(quantities, dtype=np.float64) / 100))
+    ratios = macronutrient_ratios(nutrients)
+    columns = {field: values.tolist() for field, values in nutrients.items()}
+
+    facts = []
+    for position, food_id in enumerate(food_ids):
+        nutrition = {"name": store.names[food_id]}
+        nutrition.update((field, columns[field][position]) for field in SCALED_NUTRIENTS)
+        nutrition["acidity_level"] = store.value(food_id, "acidity_level")
+        nutrition["health_benefits"] = store.record(food_id, ("health_benefits",)).get("health_benefits", [])
+        nutrition["allergens"] = profile_to_allergens(store.allergen_profile(food_id))
+        if ratios[position] is not None:
+            nutrition["macronutrient_ratios"] = ratios[position]
+        facts.append(nutrition)
+    return facts, nutrient_totals(nutrients)
@@ -0,0 +1,58 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nutrient_store import NutrientStore
+
+# Dimensions of a food's nutrient profile
+SIMILARITY_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "acidity_level")
+
+
+class NutrientVectors:
+    """Standardized nutrient profiles of every food, for nearest-neighbour queries.
+
+    Each column is scaled to zero mean and unit variance, so no nutrient
+    dominates because of its units, and a missing value counts as average.
+    Distances to one food are computed for all foods at once with a single
+    matrix-vector product.
+    """
+
+    def __init__(self, store: NutrientStore, fields: Sequence[str] = SIMILARITY_FIELDS):
+        self.fields = tuple(fields)
+        matrix = np.stack([store.column(field).astype(np.float64) for field in self.fields], axis=1)
+        with np.errstate(invalid="ignore"):
+            mean = np.nanmean(matrix, axis=0) if len(matrix) else np.zeros(len(self.fields))
+            std = np.nanstd(matrix, axis=0) if len(matrix) else np.ones(len(self.fields))
+        mean = np.nan_to_num(mean)
+        std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+        self.matrix = np.nan_to_num((matrix - mean) / std).astype(np.float32)
+        self.squared_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+    def distances(self, food_id: int) -> np.ndarray:
+        """Euclidean distance from `food_id` to every food."""
+        vector = self.matrix[food_id]
+        squared = self.squared_norms + self.squared_norms[food_id] - 2 * (self.matrix @ vector)
+        return np.sqrt(np.maximum(squared, 0))
+
+    def nearest(self, food_id: int, k: int = 10, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """The `k` foods closest to `food_id`, as (ID, distance) pairs, nearest first.
+
+        `candidates` is an optional boolean mask of the foods to consider;
+        the food itself is never returned.
+        """
+        distances = self.distances(food_id)
+        mask = np.ones(len(distances), dtype=bool) if candidates is None else candidates.copy()
+        mask[food_id] = False
+        ids = np.flatnonzero(mask)
+        if k <= 0 or not len(ids):
+            return []
+        if k < len(ids):
+            # Partial selection of the k-th distance, keeping every food tied
+            # with it so the stable sort below breaks ties by ID
+            kth = np.partition(distances[ids], k - 1)[k - 1]
+            ids = ids[distances[ids] <= kth]
+        ids = ids[np.argsort(distances[ids], kind="stable")][:k]
+        return list(zip(ids.tolist(), distances[ids].astype(float).tolist()))
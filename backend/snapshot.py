@@ -0,0 +1,233 @@
+"""Compile food_database.json into a binary snapshot the servers can mmap.
+
+Layout (all integers little-endian):
+
+    8 bytes   magic b"NUTRSNAP"
+    uint32    format version
+    uint32    header length
+    header    UTF-8 JSON: row count, source file fingerprint, the mutation
+              log checkpoint the source covers, section offsets, lookup
+              tables and schema-less extras
+    sections  8-byte aligned arrays: float32 nutrient columns, int32 table
+              codes (including the allergen profiles and liquid/solid
+              classification derived from the names),
+              NUL-separated name string tables and the precomputed
+              search index (token postings and name sort order)
+
+Usage:
+    python snapshot.py [food_database.json] [food_database.snapshot]
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from food_index import FoodIndex
+from nutrient_store import CODED_FIELDS, DERIVED_FIELDS, NUMERIC_FIELDS, NutrientStore
+from storage import atomic_open
+
+SNAPSHOT_MAGIC = b"NUTRSNAP"
+SNAPSHOT_VERSION = 4
+
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 8
+
+
+def snapshot_path_for(database_path: str) -> str:
+    """Default snapshot location next to a JSON database."""
+    return os.path.splitext(database_path)[0] + ".snapshot"
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, used as the database version."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(info: os.stat_result, sha256: str) -> Dict:
+    """Identify the exact JSON file a snapshot was compiled from by its stat and content hash."""
+    return {"size": info.st_size, "mtime_ns": info.st_mtime_ns, "sha256": sha256}
+
+
+def _string_table(values: List[str]) -> np.ndarray:
+    if any("\0" in value for value in values):
+        raise ValueError("Strings in a snapshot must not contain NUL characters")
+    return np.frombuffer("\0".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _read_string_table(data: memoryview, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return bytes(data).decode("utf-8").split("\0")
+
+
+def compile_snapshot(store: NutrientStore, snapshot_path: str, source: Optional[Dict] = None,
+                     compacted_log: Optional[Dict] = None) -> None:
+    """Write `store` and its search index to `snapshot_path` atomically.
+
+    `compacted_log` is the source's mutation log checkpoint, kept so servers
+    mapping the snapshot skip the same log entries as a JSON reader.
+    """
+    index = FoodIndex(store.names)
+    posting_offsets = np.zeros(len(index.vocabulary) + 1, dtype=np.int64)
+    posting_offsets[1:] = np.cumsum([len(index.postings[token]) for token in index.vocabulary])
+    posting_ids = [food_id for token in index.vocabulary for food_id in index.postings[token]]
+
+    arrays = {}
+    for field in NUMERIC_FIELDS:
+        arrays[f"column:{field}"] = store.column(field)
+    for field in CODED_FIELDS + DERIVED_FIELDS:
+        arrays[f"codes:{field}"] = store.codes(field)
+    arrays["names"] = _string_table(store.names)
+    arrays["index:names"] = _string_table(index.names)
+    arrays["index:vocabulary"] = _string_table(index.vocabulary)
+    arrays["index:posting_offsets"] = posting_offsets
+    arrays["index:posting_ids"] = np.asarray(posting_ids, dtype=np.int32)
+    arrays["index:sorted_name_ids"] = np.asarray(index._sorted_name_ids, dtype=np.int32)
+
+    sections = {}
+    offset = 0
+    for name, array in arrays.items():
+        sections[name] = {"offset": offset, "dtype": array.dtype.str, "count": int(array.size)}
+        offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    header = json.dumps({
+        "rows": len(store),
+        "vocabulary": len(index.vocabulary),
+        "source": source,
+        "compacted_log": compacted_log,
+        "sections": sections,
+        "tables": store.tables(),
+        "extras": {str(row): extras for row, extras in store.extras.items()},
+    }, ensure_ascii=False).encode("utf-8")
+    header += b" " * (-(_PREAMBLE.size + len(header)) % _ALIGNMENT)
+
+    # Write next to the target and rename, so readers never see a partial file
+    with atomic_open(snapshot_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % _ALIGNMENT))
+
+
+def _is_current(source: Optional[Dict], source_path: Optional[str]) -> bool:
+    """Check that the snapshot was compiled from the JSON file as it is now."""
+    if source_path is None:
+        return True
+    if source is None or not os.path.exists(source_path):
+        return False
+    stat = os.stat(source_path)
+    if stat.st_size != source["size"]:
+        return False
+    if stat.st_mtime_ns == source["mtime_ns"]:
+        return True
+    # Touched (e.g. by a checkout) but possibly unchanged; compare contents
+    return file_sha256(source_path) == source["sha256"]
+
+
+def load_snapshot(snapshot_path: str, source_path: Optional[str] = None
+                  ) -> Optional[Tuple[NutrientStore, FoodIndex, Dict]]:
+    """Map a snapshot into memory and return (store, index, header).
+
+    Returns None when the snapshot is missing, was written by another format
+    version, or is stale relative to `source_path`. The numeric columns and
+    codes stay backed by the shared, read-only file mapping.
+    """
+    try:
+        with open(snapshot_path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magic, version, header_length = _PREAMBLE.unpack_from(data)
+    except struct.error:
+        return None
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    header = json.loads(bytes(data[_PREAMBLE.size:_PREAMBLE.size + header_length]))
+    if not _is_current(header["source"], source_path):
+        return None
+
+    base = _PREAMBLE.size + header_length
+    buffer = memoryview(data)
+
+    def section(name: str) -> np.ndarray:
+        info = header["sections"][name]
+        return np.frombuffer(buffer, dtype=info["dtype"], count=info["count"], offset=base + info["offset"])
+
+    rows = header["rows"]
+    store = NutrientStore.from_arrays(
+        names=_read_string_table(section("names"), rows),
+        columns={field: section(f"column:{field}") for field in NUMERIC_FIELDS},
+        codes={field: section(f"codes:{field}") for field in CODED_FIELDS + DERIVED_FIELDS},
+        tables={field: [_table_value(field, value) for value in values]
+                for field, values in header["tables"].items()},
+        extras={int(row): extras for row, extras in header["extras"].items()},
+    )
+    index = FoodIndex.from_precomputed(
+        names=_read_string_table(section("index:names"), rows),
+        vocabulary=_read_string_table(section("index:vocabulary"), header["vocabulary"]),
+        posting_offsets=section("index:posting_offsets").tolist(),
+        posting_ids=section("index:posting_ids").tolist(),
+        sorted_name_ids=section("index:sorted_name_ids").tolist(),
+    )
+    return store, index, header
+
+
+def _table_value(field: str, value):
+    """Restore the tuple form of lookup-table entries after the JSON round trip."""
+    if value is None or field not in ("health_benefits", "allergens", "detected_allergens"):
+        return value
+    if field in ("allergens", "detected_allergens"):
+        return tuple((name, definite) for name, definite in value)
+    return tuple(value)
+
+
+def read_database(database_path: str) -> Tuple[List[Dict], Optional[Dict], Dict]:
+    """Read a JSON database in either the array or {"foods": [...]} format.
+
+    Returns the foods, the mutation log checkpoint the file covers (None if
+    it records none) and the fingerprint of the bytes actually parsed, so a
+    file replaced while they are processed is never mistaken for them.
+    """
+    with open(database_path, 'rb') as f:
+        raw = f.read()
+        source = fingerprint(os.fstat(f.fileno()), hashlib.sha256(raw).hexdigest())
+    encoding = 'utf-16' if raw[:2] in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig'
+    data = json.loads(raw.decode(encoding))
+    if isinstance(data, list):
+        return data, None, source
+    return data.get("foods", []), data.get("compacted_log"), source
+
+
+def read_foods(database_path: str) -> List[Dict]:
+    """Read the foods of a JSON database in either format."""
+    return read_database(database_path)[0]
+
+
+def main():
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    database_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(current_dir, 'food_database.json')
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else snapshot_path_for(database_path)
+
+    foods, compacted_log, source = read_database(database_path)
+    store = NutrientStore.from_foods(foods)
+    compile_snapshot(store, snapshot_path, source, compacted_log)
+    print(f"Compiled {len(store)} foods from {database_path} into {snapshot_path} "
+          f"({os.path.getsize(snapshot_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
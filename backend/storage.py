@@ -0,0 +1,117 @@
+"""Crash-safe writes of the database files, and change detection for the servers.
+
+Every rewrite goes to a temporary file in the same directory, is fsynced, and
+is renamed over the target. Readers therefore see either the old file or the
+new one, never a truncated one. The rename gives the path a new inode, which
+is how running servers notice a new database version (see FileWatcher).
+"""
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+
+def _fsync_directory(directory: str) -> None:
+    """Persist a rename in `directory` (not supported on every platform)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = 'w', encoding: str = 'utf-8') -> Iterator:
+    """Open a temporary file that replaces `path` only if the block completes.
+
+    On error the temporary file is removed and `path` is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file 0600; keep the permissions servers rely on
+        if os.path.exists(path):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        else:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+        _fsync_directory(directory)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json_atomic(path: str, data, indent: Optional[int] = 2,
+                      ensure_ascii: bool = True) -> Tuple[os.stat_result, str]:
+    """Atomically replace `path` with `data` serialized as JSON.
+
+    Returns the stat and SHA-256 of the file written, which later readers
+    of `path` cannot get reliably once another writer may have replaced it.
+    """
+    digest = hashlib.sha256()
+    with atomic_open(path, 'wb') as f:
+        for chunk in json.JSONEncoder(indent=indent, ensure_ascii=ensure_ascii).iterencode(data):
+            encoded = chunk.encode('utf-8')
+            digest.update(encoded)
+            f.write(encoded)
+        f.flush()
+        info = os.fstat(f.fileno())
+    return info, digest.hexdigest()
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int, int, int]]:
+    """(device, inode, size, mtime) of a file, or None if it does not exist."""
+    try:
+        info = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return info.st_dev, info.st_ino, info.st_size, info.st_mtime_ns
+
+
+class FileWatcher:
+    """Detect that any of `paths` was replaced, appended to, created or removed.
+
+    `changed()` stats the files at most once per `interval` seconds, so it is
+    cheap enough to call on every request.
+    """
+
+    def __init__(self, paths: Sequence[str], interval: float = 2.0):
+        self.paths = tuple(paths)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._signatures = self._current()
+        self._next_check = time.monotonic() + interval
+
+    def _current(self) -> Dict[str, Optional[Tuple[int, int, int, int]]]:
+        return {path: file_signature(path) for path in self.paths}
+
+    def changed(self) -> bool:
+        """True once per change since the previous call that returned True."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        with self._lock:
+            if now < self._next_check:
+                return False
+            self._next_check = now + self.interval
+            current = self._current()
+            if current == self._signatures:
+                return False
+            self._signatures = current
+            return True
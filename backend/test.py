@@ -1,7 +1,23 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, request
 from flask_cors import CORS
+import hashlib
+import math
 import os
-import json
+import threading
+import numpy as np
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from export import iter_ndjson
+from food_index import FoodIndex, normalize_name
+from mutation_log import MutationLog, log_path_for
+from nutrient_store import NutrientStore
+from nutrient_query import QUERY_FIELDS, query_foods
+from nutrition import nutrition_batch, nutrition_facts
+from response_cache import CachedResponse, ResponseCache
+from serialization import PrecompressedPayload, compress_response, json_response
+from similarity import NutrientVectors
+from snapshot import compile_snapshot, load_snapshot, read_database, snapshot_path_for
+from storage import FileWatcher
 
 app = Flask(__name__)
 
@@ -13,7 +29,7 @@ CORS(app, resources={
         "allow_headers": ["Content-Type", "Authorization", "Accept"],
         "supports_credentials": False,
         "max_age": 3600,
-        "expose_headers": ["Content-Type", "Authorization"]
+        "expose_headers": ["Content-Type", "Authorization", "X-Total-Count", "X-Cache", "ETag", "Last-Modified"]
     }
 })
 
@@ -48,66 +64,234 @@ def after_request(response):
     })
     return response
 
+# Compress large responses for clients that accept gzip or brotli (registered
+# before the cache validators so it runs after them and sees the final ETag)
+@app.after_request
+def compress(response):
+    return compress_response(response, request.accept_encodings)
+
+DATABASE_PATH = os.environ.get(
+    'FOOD_DATABASE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_database.json')
+)
+SNAPSHOT_PATH = snapshot_path_for(DATABASE_PATH)
+LOG_PATH = log_path_for(DATABASE_PATH)
+
 # Load food database
-def load_food_database():
+def load_food_database(strict=False):
+    """Parse the JSON database. With `strict`, a missing or unreadable file raises
+    instead of loading as empty, so a reload keeps the version it has."""
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        database_path = os.path.join(current_dir, 'food_database.json')
-        print(f"Loading database from: {database_path}")
+        print(f"Loading database from: {DATABASE_PATH}")
         
-        # Try UTF-8 first
-        try:
-            with open(database_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    print(f"Successfully loaded {len(data)} foods from database (array format)")
-                    return {"foods": data}
-                elif isinstance(data, dict) and "foods" in data:
-                    print(f"Successfully loaded {len(data['foods'])} foods from database (dictionary format)")
-                    return data
-        except Exception as e:
-            print(f"Failed to load with UTF-8: {str(e)}")
-            
-        # Try UTF-16 next
-        try:
-            with open(database_path, 'r', encoding='utf-16') as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    print(f"Successfully loaded {len(data)} foods from database (array format)")
-                    return {"foods": data}
-                elif isinstance(data, dict) and "foods" in data:
-                    print(f"Successfully loaded {len(data['foods'])} foods from database (dictionary format)")
-                    return data
-        except Exception as e:
-            print(f"Failed to load with UTF-16: {str(e)}")
-            
-        raise Exception("Could not load database with any supported encoding")
+        # The byte order mark picks UTF-16 vs UTF-8, so the file is parsed once
+        foods, compacted_log, source = read_database(DATABASE_PATH)
+        print(f"Successfully loaded {len(foods)} foods from database")
+        return {"foods": foods, "compacted_log": compacted_log, "source": source}
     except Exception as e:
         print(f"Error loading database: {str(e)}")
-        return {"foods": []}
+        if strict:
+            raise
+        return {"foods": [], "compacted_log": None, "source": None}
+
+def load_food_store(strict=False):
+    """Load the compacted database, then replay foods added since the last compaction"""
+    store, index, version, compacted_log = load_compacted_store(strict)
+    
+    log = MutationLog(LOG_PATH)
+    pending = log.added_foods(compacted_log)
+    if pending:
+        store.extend(pending)
+        index = FoodIndex(store.names)
+        version = hashlib.sha256(f"{version}:{log.digest}".encode()).hexdigest()
+        print(f"Replayed {len(pending)} foods from: {LOG_PATH}")
+    return store, index, version
+
+def load_compacted_store(strict=False):
+    """Map the compiled snapshot if it is current, otherwise parse the JSON"""
+    loaded = load_snapshot(SNAPSHOT_PATH, DATABASE_PATH)
+    if loaded:
+        store, index, header = loaded
+        print(f"Mapped database snapshot from: {SNAPSHOT_PATH}")
+        return store, index, header["source"]["sha256"], header["compacted_log"]
+    
+    data = load_food_database(strict)
+    store = NutrientStore.from_foods(data["foods"])
+    # The fingerprint of the bytes parsed, not of the path, which a
+    # maintenance script may have replaced while the store was built
+    source = data["source"]
+    if source is None:
+        return store, FoodIndex(store.names), None, None
+    
+    # Compile a snapshot so the next start maps it instead of parsing JSON
+    try:
+        compile_snapshot(store, SNAPSHOT_PATH, source, data["compacted_log"])
+        print(f"Compiled database snapshot to: {SNAPSHOT_PATH}")
+    except (OSError, ValueError) as e:
+        print(f"Could not write database snapshot: {str(e)}")
+    return store, FoodIndex(store.names), source["sha256"], data["compacted_log"]
+
+# Version of the response format: bump it whenever a deploy changes response
+# shapes or serialization, so clients and caches stop reusing old bodies
+RESPONSE_FORMAT_VERSION = "1"
+
+class LoadedDatabase(NamedTuple):
+    """One version of the database with everything derived from it, swapped as a unit on reload"""
+    store: NutrientStore
+    index: FoodIndex
+    version: Optional[str]
+    # Validator of cacheable responses: the database version and RESPONSE_FORMAT_VERSION
+    etag: Optional[str]
+    # When the database files last changed, for Last-Modified
+    modified: Optional[datetime]
+    # Standardized nutrient profiles for similar-food queries
+    vectors: NutrientVectors
+    # Every food name, serialized and compressed once
+    foods_payload: PrecompressedPayload
+
+def load_database(strict=False):
+    """Load the food store and index and precompute the derived structures"""
+    store, index, version = load_food_store(strict)
+    if not len(store):
+        print("WARNING: No foods loaded in database!")
+    else:
+        print(f"Successfully loaded {len(store)} foods")
+    
+    modified = etag = None
+    if version:
+        etag = hashlib.sha256(f"{RESPONSE_FORMAT_VERSION}:{version}".encode()).hexdigest()
+        modified = datetime.fromtimestamp(
+            max(os.path.getmtime(path) for path in (DATABASE_PATH, LOG_PATH) if os.path.exists(path)),
+            timezone.utc
+        )
+    return LoadedDatabase(store, index, version, etag, modified, NutrientVectors(store),
+                          PrecompressedPayload({"foods": store.names}))
+
+# Maintenance scripts replace the database files atomically (see storage.py);
+# a new inode, size or mtime tells this worker to load the new version. The
+# signatures are taken before loading, so a file replaced during the load
+# still counts as changed.
+database_watcher = FileWatcher((DATABASE_PATH, LOG_PATH),
+                               interval=float(os.environ.get('DATABASE_CHECK_INTERVAL', 2)))
+
+# Initialize database in columnar form with its search indexes, so requests
+# never scan the whole database
+database = load_database()
+_reload_lock = threading.Lock()
+
+def reload_database():
+    """Load the new database version in the background, then swap it in"""
+    global database
+    try:
+        database = load_database(strict=True)
+        print(f"Reloaded database version {database.version}")
+    except Exception as e:
+        # Typically a file caught mid-write; its next change triggers another reload
+        print(f"Error reloading database, keeping version {database.version}: {str(e)}")
+    finally:
+        _reload_lock.release()
+
+@app.before_request
+def use_current_database():
+    """Pin the request to one database version; start a reload if the files changed"""
+    if _reload_lock.acquire(blocking=False):
+        if database_watcher.changed():
+            # Requests keep using the old version until the new one is loaded
+            threading.Thread(target=reload_database, daemon=True).start()
+        else:
+            _reload_lock.release()
+    g.db = database
+
+# Read endpoints whose responses depend only on the URL and the database
+# version, so browsers and CDNs can cache and revalidate them
+HTTP_CACHEABLE_ENDPOINTS = ("list_foods", "export_foods", "list_categories", "query_foods_by_nutrients",
+                            "similar_foods", "get_nutrition", "search_foods", "autocomplete_foods")
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 300))
+
+def is_http_cacheable():
+    return request.method in ("GET", "HEAD") and request.endpoint in HTTP_CACHEABLE_ENDPOINTS and g.db.etag
+
+@app.before_request
+def answer_not_modified():
+    """Answer a matching If-None-Match with 304 before doing any work"""
+    if is_http_cacheable() and request.if_none_match.contains_weak(g.db.etag):
+        return app.response_class(status=304)
+
+@app.after_request
+def add_cache_validators(response):
+    """Strong ETag (database version and response format version), Last-Modified and Cache-Control"""
+    if is_http_cacheable() and response.status_code in (200, 304):
+        # A 304 answering a weak (compressed) ETag repeats it as weak
+        response.set_etag(g.db.etag, weak=response.status_code == 304
+                          and not request.if_none_match.is_strong(g.db.etag))
+        if g.db.modified:
+            response.last_modified = g.db.modified
+        response.cache_control.public = True
+        response.cache_control.max_age = HTTP_CACHE_MAX_AGE
+        # The CORS headers echo the request's Origin
+        response.vary.add("Origin")
+        response.vary.add("Accept-Encoding")
+        if response.status_code == 200:
+            response.make_conditional(request)
+    return response
 
-# Initialize database
-food_database = load_food_database()
-if not food_database["foods"]:
-    print("WARNING: No foods loaded in database!")
-else:
-    print(f"Successfully loaded {len(food_database['foods'])} foods")
+# Serialized responses for repeated queries, dropped when the database version changes
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get('RESPONSE_CACHE_SIZE', 2048)),
+    ttl=float(os.environ.get('RESPONSE_CACHE_TTL', 300))
+)
+
+# Response headers stored with a cached body
+CACHED_HEADERS = ("X-Total-Count",)
+
+def cached_json(key, build):
+    """
+    Serve a JSON response from the response cache, or build it and cache it.
+    `build` returns anything a view may return; only 200 responses are kept.
+    """
+    cached = response_cache.get(key, g.db.etag)
+    if cached is not None:
+        response = app.response_class(cached.body, mimetype="application/json")
+        response.headers.extend(cached.headers)
+        response.headers["X-Cache"] = "HIT"
+        return response
+    
+    response = app.make_response(build())
+    if response.status_code == 200:
+        headers = tuple((name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers)
+        response_cache.put(key, g.db.etag, CachedResponse(response.get_data(), headers))
+    response.headers["X-Cache"] = "MISS"
+    return response
 
 @app.route("/")
 def home():
     """Home endpoint to check if server is running"""
-    return jsonify({
+    return json_response({
         "status": "ok",
         "message": "Server is running",
-        "foods_count": len(food_database["foods"])
+        "foods_count": len(g.db.store),
+        "database_version": g.db.version
     })
 
 @app.route("/api/foods")
 def list_foods():
     """List all available foods"""
-    return jsonify({
-        "foods": [food["name"] for food in food_database["foods"]]
-    })
+    return g.db.foods_payload.response(request.accept_encodings)
+
+def comma_separated_args(name):
+    """Values of a query parameter given repeatedly and/or comma-separated"""
+    return [value.strip() for arg in request.args.getlist(name) for value in arg.split(',') if value.strip()]
+
+@app.route("/api/export")
+def export_foods():
+    """
+    Stream full food records as newline-delimited JSON.
+    Optional category= filter (repeatable or comma-separated) and fields= projection.
+    """
+    categories = comma_separated_args('category')
+    fields = comma_separated_args('fields')
+    records = iter_ndjson(g.db.store, categories or None, fields or None)
+    return app.response_class(records, mimetype="application/x-ndjson")
 
 def convert_to_ml(value, unit):
     """Convert various units to milliliters"""
@@ -119,66 +303,37 @@ def convert_to_ml(value, unit):
     }
     return float(value) * conversions.get(unit, 1)
 
-# List of keywords that indicate a liquid food
-LIQUID_FOODS = [
-    "coffee", "tea", "juice", "milk", "smoothie", "shake", "beverage", "drink",
-    "americano", "espresso", "latte", "cappuccino", "water", "soda", "beer", "wine",
-    "cortado", "macchiato", "mocha", "frappuccino", "cold brew", "nitro", "lungo",
-    "ristretto", "flat white", "affogato"
-]
-
-def is_liquid_food(food_name):
-    """Check if a food is a liquid based on its name"""
-    return any(keyword in food_name.lower() for keyword in LIQUID_FOODS)
-
-# Common allergens and their related keywords
-DEFINITE_ALLERGEN_INDICATORS = {
-    "Dairy": ["milk", "cheese", "yogurt", "butter", "chocolate", "latte", "cappuccino", "mocha", "hot chocolate"],
-    "Nuts": ["almond", "walnut", "pecan", "cashew", "pistachio", "hazelnut", "macadamia"],
-    "Peanut": ["peanut", "peanuts"],
-    "Fish": ["salmon", "tuna", "cod", "tilapia", "halibut"],
-    "Shellfish": ["shrimp", "crab", "lobster"],
-    "Egg": ["egg ", "eggs"],  # space after 'egg' to avoid matching 'eggplant'
-    "Soy": ["tofu", "soya", "edamame"],
-    "Wheat": ["wheat"]
-}
-
-# Keywords that suggest possible presence of allergens
-POSSIBLE_ALLERGEN_INDICATORS = {
-    "Dairy": ["cream", "whey", "casein", "lactose", "milky"],
-    "Nuts": ["nut"],
-    "Gluten": ["rye", "barley", "oats", "bread", "pasta", "flour", "cereal"],
-    "Soy": ["miso", "tempeh"],
-    "Egg": ["mayonnaise", "meringue", "albumin"],
-    "Fish": ["fish", "anchovy"],
-    "Shellfish": ["prawn", "clam", "mussel", "oyster"],
-    "Sesame": ["sesame", "tahini"]
-}
-
-def detect_allergens(food_name):
+def resolve_food(query, quantity, unit):
     """
-    Detect allergens in a food based on its name, distinguishing between
-    definite and possible allergens
+    Find the food for a nutrition request and check its quantity and unit.
+    Returns (food_id, None) on success or (None, (error message, status)).
     """
-    food_name = food_name.lower()
-    # Replace spaces in compound words to catch phrases like "hot chocolate"
-    food_name_compound = food_name.replace(" ", "")
-    definite_allergens = []
-    possible_allergens = []
+    if not query:
+        return None, ("Query parameter is required", 400)
+    
+    # NaN would pass the <= 0 check and turn every nutrient into null
+    if not math.isfinite(quantity) or quantity <= 0:
+        return None, ("Quantity must be a positive, finite number", 400)
+
+    # Exact name lookup first, then fall back to the first partial match
+    food_id = g.db.index.lookup(query)
+    if food_id is None:
+        matches = g.db.index.search(query)
+        if not matches:
+            return None, (f"No food found matching '{query}'", 404)
+        food_id = matches[0]
+    name = g.db.store.names[food_id]
     
-    # Check for definite allergens
-    for allergen, keywords in DEFINITE_ALLERGEN_INDICATORS.items():
-        if any(keyword in food_name for keyword in keywords) or any(keyword.replace(" ", "") in food_name_compound for keyword in keywords):
-            definite_allergens.append({"name": allergen, "definite": True})
+    # Liquid/solid was classified when the food was loaded
+    is_liquid = g.db.store.is_liquid(food_id)
     
-    # Check for possible allergens
-    for allergen, keywords in POSSIBLE_ALLERGEN_INDICATORS.items():
-        # Skip if we already found this as a definite allergen
-        if not any(a["name"] == allergen for a in definite_allergens):
-            if any(keyword in food_name for keyword in keywords) or any(keyword.replace(" ", "") in food_name_compound for keyword in keywords):
-                possible_allergens.append({"name": allergen, "definite": False})
+    # Validate unit
+    if is_liquid and unit != 'ml':
+        return None, (f"Please use 'ml' for liquid foods like {name}", 400)
+    elif not is_liquid and unit != 'g':
+        return None, (f"Please use 'g' for solid foods like {name}", 400)
     
-    return definite_allergens + possible_allergens
+    return food_id, None
 
 @app.route("/api/nutrition")
 def get_nutrition():
@@ -188,96 +343,258 @@ def get_nutrition():
         quantity = float(request.args.get('quantity', 100))
         unit = request.args.get('unit', 'g')
 
-        if not query:
-            return jsonify({"error": "Query parameter is required"}), 400
-        
-        if quantity <= 0:
-            return jsonify({"error": "Quantity must be positive"}), 400
-
-        # Split query into words for more flexible matching
-        query_words = query.lower().split()
-        
-        # Find all matches
-        matches = []
-        for food in food_database["foods"]:
-            food_name = food["name"].lower()
-            if all(word in food_name for word in query_words):
-                matches.append(food)
-        
-        if not matches:
-            return jsonify({"error": f"No food found matching '{query}'"}), 404
-        
-        # Get best match (exact match first, then first partial match)
-        food_data = next(
-            (food for food in matches if food["name"].lower() == query.lower()),
-            matches[0]
-        )
-        
-        # Determine if it's a liquid food
-        is_liquid = any(keyword in food_data["name"].lower() for keyword in LIQUID_FOODS)
-        
-        # Validate unit
-        if is_liquid and unit != 'ml':
-            return jsonify({"error": f"Please use 'ml' for liquid foods like {food_data['name']}"}), 400
-        elif not is_liquid and unit != 'g':
-            return jsonify({"error": f"Please use 'g' for solid foods like {food_data['name']}"}), 400
-        
-        # Calculate scaled nutrition values
-        scale_factor = quantity / 100
-        nutrition = {
-            "name": food_data["name"],
-            "calories": round(food_data["calories"] * scale_factor, 1),
-            "protein": round(food_data["protein"] * scale_factor, 2),
-            "carbs": round(food_data["carbs"] * scale_factor, 2),
-            "fat": round(food_data["fat"] * scale_factor, 2),
-            "fiber": round(food_data["fiber"] * scale_factor, 2),
-            "acidity_level": food_data.get("acidity_level"),
-            "health_benefits": food_data.get("health_benefits", []),
-            "allergens": detect_allergens(food_data["name"])
-        }
-        
-        # Calculate macronutrient ratios
-        total_macros = (nutrition["protein"] * 4) + (nutrition["carbs"] * 4) + (nutrition["fat"] * 9)
-        if total_macros > 0:
-            nutrition["macronutrient_ratios"] = {
-                "protein": round((nutrition["protein"] * 4 / total_macros) * 100),
-                "carbs": round((nutrition["carbs"] * 4 / total_macros) * 100),
-                "fat": round((nutrition["fat"] * 9 / total_macros) * 100)
-            }
+        def build():
+            food_id, error = resolve_food(query, quantity, unit)
+            if error:
+                message, status = error
+                return json_response({"error": message}), status
             
-            # Ensure ratios sum to 100%
-            total = sum(nutrition["macronutrient_ratios"].values())
-            if total != 100:
-                # Adjust the largest value to make sum 100
-                largest_key = max(nutrition["macronutrient_ratios"], 
-                                key=lambda k: nutrition["macronutrient_ratios"][k])
-                nutrition["macronutrient_ratios"][largest_key] += (100 - total)
+            # Scaled nutrition values and macronutrient ratios
+            return json_response(nutrition_facts(g.db.store, [food_id], [quantity])[0])
         
-        return jsonify(nutrition)
+        return cached_json(("nutrition", normalize_name(query), quantity, unit), build)
     except ValueError as e:
-        return jsonify({"error": str(e)}), 400
+        return json_response({"error": str(e)}), 400
     except Exception as e:
         print(f"Error processing request: {str(e)}")
-        return jsonify({"error": "An unexpected error occurred"}), 500
+        return json_response({"error": "An unexpected error occurred"}), 500
+
+# Largest number of items accepted by one batch request
+BATCH_MAX_ITEMS = 100
+
+@app.route("/api/nutrition/batch", methods=["POST"])
+def get_nutrition_batch():
+    """
+    Get nutrition information for a whole meal or recipe in one request.
+    Expects {"items": [{"query": ..., "quantity": ..., "unit": ...}, ...]}
+    and returns a result (or error) per item plus totals over the valid items.
+    """
+    try:
+        payload = request.get_json(silent=True)
+        items = payload.get("items") if isinstance(payload, dict) else payload
+        if not isinstance(items, list) or not items:
+            return json_response({"error": "Request body must contain a non-empty 'items' list"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return json_response({"error": f"At most {BATCH_MAX_ITEMS} items are allowed per batch"}), 400
+
+        results = [None] * len(items)
+        positions, queries, food_ids, quantities = [], [], [], []
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[position] = {"error": "Each item must be an object"}
+                continue
+            query = item.get('query', '')
+            if not isinstance(query, str):
+                results[position] = {"error": "Query must be a string"}
+                continue
+            query = query.strip()
+            try:
+                quantity = float(item.get('quantity', 100))
+            except (TypeError, ValueError):
+                results[position] = {"query": query, "error": "Quantity must be a number"}
+                continue
+            food_id, error = resolve_food(query, quantity, item.get('unit', 'g'))
+            if error:
+                results[position] = {"query": query, "error": error[0]}
+                continue
+            positions.append(position)
+            queries.append(query)
+            food_ids.append(food_id)
+            quantities.append(quantity)
+
+        # Scale every valid item in one vectorized pass
+        facts, totals = nutrition_batch(g.db.store, food_ids, quantities)
+        for position, query, nutrition in zip(positions, queries, facts):
+            results[position] = {"query": query, **nutrition}
+        
+        return json_response({
+            "items": results,
+            "totals": totals
+        })
+    except Exception as e:
+        print(f"Error processing batch request: {str(e)}")
+        return json_response({"error": "An unexpected error occurred"}), 500
+
+# Bounds for /api/search pagination
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
 
 @app.route("/api/search")
 def search_foods():
-    """Search for food items that match the query"""
+    """Search for food items that match the query, best matches first"""
     query = request.args.get('query', '').lower()
     if not query:
-        return jsonify([])
+        return json_response([])
+    
+    try:
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return json_response({"error": "limit and offset must be integers"}), 400
+    limit = max(0, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    fields = comma_separated_args('fields')
+    categories = comma_separated_args('category')
+    
+    def build():
+        # Restrict matches to the requested categories via the category index
+        within = set(g.db.store.category_rows(categories)) if categories else None
+        total, page = g.db.index.ranked_search(query, offset, limit, within)
+        matches = [g.db.store.record(food_id, fields) for food_id in page]
+        
+        response = json_response(matches)
+        response.headers["X-Total-Count"] = str(total)
+        return response
+    
+    return cached_json(("search", normalize_name(query), offset, limit, tuple(fields), tuple(categories)), build)
+
+@app.route("/api/query")
+def query_foods_by_nutrients():
+    """
+    Find foods by nutrient ranges, e.g. ?protein_min=20&calories_max=200.
+    Any of QUERY_FIELDS takes _min/_max bounds (inclusive); category= and
+    exclude_allergens= filter further, sort=<field>&order=desc orders the page.
+    """
+    try:
+        ranges = {}
+        for field in QUERY_FIELDS:
+            minimum, maximum = (request.args.get(f'{field}_{bound}') for bound in ('min', 'max'))
+            if minimum is not None or maximum is not None:
+                ranges[field] = (
+                    None if minimum is None else float(minimum),
+                    None if maximum is None else float(maximum)
+                )
+        limit = int(request.args.get('limit', SEARCH_DEFAULT_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError as e:
+        return json_response({"error": str(e)}), 400
+    limit = max(0, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    
+    sort = request.args.get('sort') or None
+    if sort is not None and sort not in QUERY_FIELDS:
+        return json_response({"error": f"sort must be one of: {', '.join(QUERY_FIELDS)}"}), 400
+    descending = request.args.get('order', 'asc').lower() == 'desc'
+    categories = comma_separated_args('category')
+    exclude_allergens = comma_separated_args('exclude_allergens')
+    fields = comma_separated_args('fields')
+    
+    def build():
+        total, page = query_foods(g.db.store, ranges, categories or None, exclude_allergens or None,
+                                  sort, descending, offset, limit)
+        response = json_response([g.db.store.record(food_id, fields) for food_id in page])
+        response.headers["X-Total-Count"] = str(total)
+        return response
+    
+    key = ("query", tuple(sorted(ranges.items())), tuple(categories), tuple(exclude_allergens),
+           sort, descending, offset, limit, tuple(fields))
+    return cached_json(key, build)
+
+# Bounds for the number of similar foods returned
+SIMILAR_DEFAULT_LIMIT = 10
+SIMILAR_MAX_LIMIT = 50
+
+@app.route("/api/similar")
+def similar_foods():
+    """
+    Foods with the closest nutrient profile to `query`, e.g. to find substitutes.
+    scope=category (default) stays within the food's category, scope=any does not;
+    lower_calories=true keeps only foods with fewer calories.
+    """
+    query = request.args.get('query', '').strip()
+    if not query:
+        return json_response({"error": "Query parameter is required"}), 400
+    try:
+        limit = int(request.args.get('limit', SIMILAR_DEFAULT_LIMIT))
+    except ValueError:
+        return json_response({"error": "limit must be an integer"}), 400
+    limit = max(0, min(limit, SIMILAR_MAX_LIMIT))
+    scope = request.args.get('scope', 'category').lower()
+    if scope not in ('category', 'any'):
+        return json_response({"error": "scope must be 'category' or 'any'"}), 400
+    lower_calories = request.args.get('lower_calories', '').lower() in ('1', 'true', 'yes')
+    fields = comma_separated_args('fields')
     
-    matches = []
-    for food in food_database["foods"]:
-        # Split the query into words for more flexible matching
-        query_words = query.split()
-        food_name = food["name"].lower()
+    def build():
+        food_id = g.db.index.lookup(query)
+        if food_id is None:
+            matches = g.db.index.search(query)
+            if not matches:
+                return json_response({"error": f"No food found matching '{query}'"}), 404
+            food_id = matches[0]
+        
+        candidates = None
+        if scope == 'category':
+            candidates = g.db.store.category_codes == g.db.store.category_codes[food_id]
+        if lower_calories:
+            calories = g.db.store.column("calories")
+            below = calories < calories[food_id]
+            candidates = below if candidates is None else candidates & below
         
-        # Check if all query words are in the food name
-        if all(word in food_name for word in query_words):
-            matches.append(food)
+        similar = []
+        for similar_id, distance in g.db.vectors.nearest(food_id, limit, candidates):
+            record = g.db.store.record(similar_id, fields)
+            record["distance"] = round(distance, 4)
+            similar.append(record)
+        return json_response({
+            "food": g.db.store.record(food_id, fields),
+            "similar": similar
+        })
     
-    return jsonify(matches)
+    return cached_json(("similar", normalize_name(query), limit, scope, lower_calories, tuple(fields)), build)
+
+@app.route("/api/categories")
+def list_categories():
+    """
+    Category facets: every category with its number of foods, or with the
+    number of foods matching `query` when one is given
+    """
+    query = request.args.get('query', '')
+    if query.strip():
+        matches = g.db.index.search(query)
+        counts = np.bincount(g.db.store.category_codes[matches], minlength=len(g.db.store.categories.values))
+        facets = {
+            category: count
+            for category, count in zip(g.db.store.categories.values, counts.tolist())
+            if category is not None and count
+        }
+        total = len(matches)
+    else:
+        # Straight from the category index, without touching any food
+        facets = g.db.store.category_counts()
+        total = len(g.db.store)
+    
+    return json_response({
+        "categories": [{"name": name, "count": count} for name, count in sorted(facets.items())],
+        "total": total
+    })
+
+# Bounds for the number of suggestions returned per keystroke
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_FIELDS = ("name", "category", "serving_size", "serving_unit", "is_liquid")
+
+@app.route("/api/autocomplete")
+def autocomplete_foods():
+    """Suggest food names completing a partially typed query"""
+    query = request.args.get('query', '')
+    try:
+        limit = int(request.args.get('limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+    except ValueError:
+        return json_response({"error": "limit must be an integer"}), 400
+    limit = max(0, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    
+    suggestions = [
+        g.db.store.record(food_id, AUTOCOMPLETE_FIELDS)
+        for food_id in g.db.index.autocomplete(query, limit)
+    ]
+    
+    return json_response(suggestions)
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    """Hit/miss counters of the response cache in this worker"""
+    return json_response(response_cache.stats())
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
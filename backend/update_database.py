@@ -2,6 +2,8 @@ import json
 import os
 import shutil
 
+from storage import atomic_open
+
 def update_database():
     """Replace food_database.json with the contents of manual_foods.json"""
     # Check if manual_foods.json exists
@@ -15,8 +17,10 @@ def update_database():
         shutil.copy2('food_database.json', backup_path)
         print(f"Created backup of original database at {backup_path}")
     
-    # Copy manual_foods.json to food_database.json
-    shutil.copy2('manual_foods.json', 'food_database.json')
+    # Copy manual_foods.json to food_database.json, replacing it atomically
+    # so running servers never read a partial copy
+    with open('manual_foods.json', 'rb') as source, atomic_open('food_database.json', 'wb') as target:
+        shutil.copyfileobj(source, target)
     print("Successfully updated food_database.json with 10,000 food entries")
     
     # Verify the update
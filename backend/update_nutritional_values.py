@@ -2,6 +2,7 @@
 
 import json
 import os
+from storage import write_json_atomic
 from typing import Dict, List, Union
 
 # Base nutritional values per 100g/ml for different food categories
@@ -177,9 +178,8 @@ def update_database():
         # Update database
         database["foods"] = new_foods
         
-        # Save updated database
-        with open(database_path, 'w', encoding='utf-8') as f:
-            json.dump(database, f, indent=2)
+        # Save updated database (atomically, servers may be reading it)
+        write_json_atomic(database_path, database)
         
         print(f"Database updated successfully!")
         print(f"Updated {updates} entries with accurate nutritional values")
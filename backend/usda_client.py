@@ -0,0 +1,157 @@
+"""Asynchronous, rate-limited client for the USDA FoodData Central API.
+
+Requests share one pooled httpx.AsyncClient, at most `max_concurrency` are
+in flight, and a token bucket keeps the request rate within the API key's
+quota. 429/5xx responses and transport errors are retried with jittered
+exponential backoff (honouring Retry-After). With an HTTPCache, responses
+already on disk are served without a request. Pass an httpx transport, e.g.
+httpx.MockTransport, to run against a stub instead of the real API.
+"""
+
+import asyncio
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import httpx
+
+from fdc_bulk import batched
+from http_cache import HTTPCache
+
+USDA_BASE_URL = 'https://api.nal.usda.gov/fdc/v1'
+
+# The documented quota for a free API key
+DEFAULT_REQUESTS_PER_HOUR = 3600
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average, with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncUSDAClient:
+    """Use as `async with AsyncUSDAClient(api_key) as client: ...`."""
+
+    def __init__(self, api_key: Optional[str], base_url: str = USDA_BASE_URL,
+                 requests_per_hour: float = DEFAULT_REQUESTS_PER_HOUR, burst: int = 10,
+                 max_concurrency: int = 8, max_retries: int = 4, backoff: float = 1.0,
+                 timeout: float = 30.0, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 cache: Optional[HTTPCache] = None):
+        self.api_key = api_key
+        self.cache = cache
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(requests_per_hour / 3600, burst)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={'X-Api-Key': api_key or ''},
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> "AsyncUSDAClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Full-jitter exponential backoff, or the server's Retry-After if longer."""
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('Retry-After', 0)))
+            except ValueError:
+                pass
+        return delay
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Send one request within the rate limit, retrying transient failures."""
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            response = None
+            async with self._semaphore:
+                try:
+                    response = await self._client.request(method, path, **kwargs)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        raise
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt >= self.max_retries):
+                response.raise_for_status()
+                return response
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def request_json(self, method: str, path: str, params: Optional[Dict] = None, body=None):
+        """Decoded JSON response, served from the cache when it has the request."""
+        # Cache reads and fsynced writes block, so they run off the event loop
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_json, method, path, params, body)
+            if cached is not None:
+                return cached
+        response = await self.request(method, path, params=params, json=body)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, method, path, params, body, response.content)
+        return response.json()
+
+    async def get_json(self, path: str, params: Optional[Dict] = None):
+        return await self.request_json('GET', path, params=params)
+
+    async def post_json(self, path: str, body):
+        return await self.request_json('POST', path, body=body)
+
+    async def search_foods(self, query: str, page_size: int = 50, page_number: int = 1,
+                           data_types: Iterable[str] = ('Survey (FNDDS)', 'Branded')) -> List[Dict]:
+        params = {
+            'query': query,
+            'pageSize': page_size,
+            'pageNumber': page_number,
+            'dataType': list(data_types),
+            'requireAllWords': True
+        }
+        return (await self.get_json('/foods/search', params)).get('foods', [])
+
+    async def get_food_details(self, fdc_id) -> Dict:
+        return await self.get_json(f'/food/{fdc_id}')
+
+    async def get_foods(self, fdc_ids: Sequence) -> List[Dict]:
+        """Details of up to MAX_IDS_PER_REQUEST foods in one POST /foods request."""
+        return await self.post_json('/foods', {'fdcIds': [int(fdc_id) for fdc_id in fdc_ids]})
+
+    async def get_many_food_details(self, fdc_ids: Iterable) -> List[Dict]:
+        """Details for every ID, fetched concurrently in batches; failed batches are reported and skipped."""
+        async def fetch(batch):
+            try:
+                return await self.get_foods(batch)
+            except httpx.HTTPError as e:
+                print(f"Error fetching food details for {batch}: {e}")
+                return []
+
+        results = await asyncio.gather(*(fetch(batch) for batch in batched(fdc_ids)))
+        return [details for batch in results for details in batch]
@@ -8,7 +8,8 @@ interface FoodItem {
   name: string;
   serving_size: number;
   serving_unit: string;
-  [key: string]: string | number;  // Better typing for additional properties
+  is_liquid?: boolean;  // Classified by the backend when the database is loaded
+  [key: string]: string | number | boolean | undefined;  // Better typing for additional properties
 }
 
 interface NutritionData {
@@ -47,6 +48,9 @@ const isLiquidFood = (foodName: string): boolean => {
   return LIQUID_FOODS.some(keyword => foodName.toLowerCase().includes(keyword));
 };
 
+// Prefer the backend's precomputed classification for suggestions
+const isLiquidSuggestion = (item: FoodItem): boolean => item.is_liquid ?? isLiquidFood(item.name);
+
 export default function Home() {
   const [mounted, setMounted] = useState(false);
   const [foodQuery, setFoodQuery] = useState('');
@@ -88,7 +92,7 @@ export default function Home() {
     
     try {
       const response = await fetch(
-        `${process.env.NEXT_PUBLIC_API_URL}/api/search?query=${encodeURIComponent(searchQuery.toLowerCase())}`
+        `${process.env.NEXT_PUBLIC_API_URL}/api/autocomplete?query=${encodeURIComponent(searchQuery.toLowerCase())}`
       );
       const data = await response.json();
       // Filter out any entries with size indicators and remove duplicates
@@ -125,7 +129,7 @@ export default function Home() {
     setFoodQuery(suggestion.name);
     setShowSuggestions(false);
     setQuantity('100');
-    setUnit(isLiquidFood(suggestion.name) ? 'ml' : 'g');
+    setUnit(isLiquidSuggestion(suggestion) ? 'ml' : 'g');
     document.body.classList.remove('results-shown');
   };
 
@@ -230,7 +234,7 @@ export default function Home() {
                         >
                           <span className="font-medium text-slate-900 dark:text-white">{suggestion.name}</span>
                           <span className="text-sm text-slate-600 dark:text-slate-300 ml-2">
-                            (100 {isLiquidFood(suggestion.name) ? 'ml' : 'g'})
+                            (100 {isLiquidSuggestion(suggestion) ? 'ml' : 'g'})
                           </span>
                         </div>
                       ))}